@@ -99,6 +99,63 @@ class RAGConfig:
 
     chunk_size: int = 512
     cache_ttl_minutes: int = 30
+    # Fracción del TTL a partir de la cual el esquema se recarga en segundo plano (las
+    # consultas siguen usando el caché actual hasta que termina). 0 = desactivado: cada
+    # recarga vuelve a leer todo el catálogo; con reuse_table_descriptions solo las tablas
+    # que cambiaron generan embeddings nuevos.
+    schema_refresh_ahead: float = 0.0
+
+    # Caché en memoria de embeddings de consultas (reintentos y consultas repetidas)
+    query_embedding_cache_size: int = 1024
+    query_embedding_cache_ttl: int = 600  # Segundos
+
+    # Generación de embeddings vía OpenAI
+    embedding_batch_size: int = 100  # Máximo de textos por request
+    # Tokens por request (estimados si no hay tiktoken). La API admite hasta 300k tokens y
+    # 2048 textos por request; se deja margen para el error de la estimación len/3.
+    embedding_batch_max_tokens: int = 250000
+    embedding_max_workers: int = 6  # Batches enviados en paralelo (I/O-bound)
+    embedding_max_retries: int = 3  # Reintentos por batch ante 429/errores transitorios
+    embedding_cache_fp16: bool = True  # Guardar la caché de embeddings en float16 (la mitad de espacio)
+    embedding_max_connections: int = 32  # Pool keep-alive del cliente HTTP de embeddings
+    embedding_http2: bool = True  # Multiplexar batches en una conexión (requiere paquete h2)
+
+    # Tablas por bloque del pipeline de embeddings: mientras la API procesa un bloque
+    # se obtienen muestras y descripciones del siguiente
+    embedding_pipeline_chunk: int = 500
+
+    # Incluir filas de muestra (SELECT FIRST 10) en las descripciones de tablas.
+    # Desactivado por defecto: los valores reales de la BD se envían a la API de embeddings
+    # de OpenAI y quedan guardados en metadata.json del almacén vectorial.
+    include_sample_data: bool = False
+    # Muestras en paralelo (las conexiones salen del pool de la BD, así que la concurrencia
+    # real está acotada por database.connection_pool_size)
+    sample_fetch_workers: int = 8
+    # Segundos por consulta de muestra; en Firebird 4+ es también el timeout de la sentencia
+    # en el servidor, así que una consulta colgada se cancela y devuelve su conexión al pool
+    sample_fetch_timeout: float = 10.0
+
+    # Generación de descripciones en paralelo (CPU-bound, procesos separados).
+    # En Windows cada proceso reimporta los módulos, así que solo compensa con muchas tablas.
+    description_workers: int = 0  # 0 = os.cpu_count()
+    description_parallel_min_tables: int = 2000
+    # Reutilizar descripción y embedding guardados de tablas cuya estructura no cambió
+    # (huella de columnas, PK, FK, índices y diccionario de MicroSIP); solo se actualiza el
+    # volumen de registros. No aplica con include_sample_data: las muestras cambian con los datos.
+    reuse_table_descriptions: bool = True
+
+    # Índice vectorial (FAISS es opcional; sin él se usa numpy)
+    use_faiss: bool = True
+    # Tipo de índice: "auto" (Flat exacto, IVF desde faiss_ivf_min_tables), "flat", "ivf", "hnsw"
+    # o "sq8" (int8 escalar, re-ordenado en fp32)
+    faiss_index_type: str = "auto"
+    faiss_ivf_min_tables: int = 10000  # Debajo de esto se usa IndexFlatIP exacto
+    faiss_hnsw_m: int = 32  # Vecinos por nodo del grafo HNSW
+    faiss_hnsw_ef_search: int = 64  # Amplitud de búsqueda HNSW (más = mejor recall, más lento)
+    # Precisión de la matriz de escaneo numpy: "none" (fp32), "fp16" o "int8".
+    # Con fp16/int8 los mejores candidatos se re-ordenan en fp32. Solo aplica sin índice
+    # FAISS (use_faiss=False o faiss no instalado); con FAISS usar faiss_index_type="sq8".
+    vector_quantization: str = "none"
 
     # Soporte para procedimientos almacenados
     enable_stored_procedures: bool = True
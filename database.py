@@ -6,10 +6,12 @@ con soporte para streaming de grandes volúmenes de datos.
 """
 
 import os
+import sys
 import time
 import threading
 from typing import Dict, List, Tuple, Optional, Any, Generator, Iterator
 from dataclasses import dataclass
+from datetime import timedelta
 from contextlib import contextmanager
 from queue import Queue, Empty
 import pandas as pd
@@ -18,9 +20,23 @@ from config import config, StatusMessages
 from utils import logger, Timer, timing_decorator, SQLValidator, DataFormatter, SchemaStatsCache
 
 
-@dataclass
+# __slots__ en dataclasses solo está disponible desde Python 3.10
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+def _quote_identifier(name: str) -> str:
+    """Identificador entre comillas dobles (respeta mayúsculas y caracteres especiales)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class TableInfo:
-    """Información de una tabla de la base de datos."""
+    """Información de una tabla de la base de datos.
+
+    Se declara con __slots__ (Python 3.10+) porque sus atributos se leen
+    miles de veces por consulta RAG; cualquier metadato derivado que se quiera
+    cachear debe declararse como campo.
+    """
     name: str
     owner: str
     type: str  # TABLE, VIEW, etc.
@@ -32,8 +48,11 @@ class TableInfo:
     last_update: Optional[str] = None
     is_active: bool = True
     description: str = ""
+    name_lower: str = ""  # Se calcula una vez en __post_init__
     
     def __post_init__(self):
+        if not self.name_lower:
+            self.name_lower = self.name.lower()
         if self.columns is None:
             self.columns = []
         if self.primary_keys is None:
@@ -302,6 +321,8 @@ class FirebirdDB:
                         continue
 
             self._schema_cache[cache_key] = schema
+            # Listado completo del catálogo: incluye tablas cuya carga falló arriba
+            self._schema_cache['catalog_tables'] = frozenset(tables_info)
             logger.info(f"✅ Esquema extraído: {len(schema)} tablas")
 
             return schema
@@ -310,6 +331,15 @@ class FirebirdDB:
             logger.error("❌ Error extrayendo esquema", e)
             return {}
 
+    def get_catalog_table_names(self) -> Optional[frozenset]:
+        """
+        Nombres de todas las tablas del último listado exitoso del catálogo.
+
+        A diferencia de get_full_schema, incluye las tablas cuya estructura no se pudo
+        cargar. None si aún no se ha listado el catálogo.
+        """
+        return self._schema_cache.get('catalog_tables')
+
     def _get_tables_info_with_timeout(self, conn, timeout_seconds: int = 30) -> Dict[str, TableInfo]:
         """Obtener información básica de tablas con timeout."""
         try:
@@ -388,6 +418,7 @@ class FirebirdDB:
             
             column_info = {
                 'name': field_name,
+                'name_lower': field_name.lower(),  # Evita .lower() repetido en el análisis RAG
                 'position': row[1],
                 'nullable': row[2] is None,
                 'data_type': field_type,
@@ -879,48 +910,100 @@ class FirebirdDB:
     
     def get_table_relationships(self, table_name: str) -> Dict[str, List[Dict[str, Any]]]:
         """Obtener relaciones detalladas de una tabla con otras."""
+        return self.get_table_relationships_bulk([table_name]).get(table_name, {})
+
+    def get_table_relationships_bulk(self, table_names: List[str]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        """
+        Obtener relaciones de varias tablas con una sola pasada por el esquema.
+
+        Returns:
+            {tabla: {'references': [...], 'referenced_by': [...]}} solo para tablas del esquema
+        """
         try:
             schema = self.get_full_schema()
-            if table_name not in schema:
-                return {}
-
-            table_info = schema[table_name]
-            relationships = {
-                'references': [],  # Esta tabla referencia a otras
-                'referenced_by': []  # Otras tablas referencian a esta
-            }
+            result = {}
 
-            # Tablas que esta tabla referencia (foreign keys salientes)
-            for fk in table_info.foreign_keys:
-                relationships['references'].append({
-                    'table': fk['referenced_table'],
-                    'columns': fk.get('columns', []),
-                    'referenced_columns': fk.get('referenced_columns', []),
-                    'constraint_name': fk.get('constraint_name', ''),
-                    'type': 'foreign_key'
-                })
-
-            # Buscar tablas que referencian a esta (foreign keys entrantes)
-            for other_table_name, other_table in schema.items():
-                if other_table_name == table_name:
+            # Tablas que cada tabla referencia (foreign keys salientes)
+            for table_name in table_names:
+                if table_name not in schema or table_name in result:
                     continue
-
-                for fk in other_table.foreign_keys:
-                    if fk['referenced_table'] == table_name:
-                        relationships['referenced_by'].append({
-                            'table': other_table_name,
+                result[table_name] = {
+                    'references': [
+                        {
+                            'table': fk['referenced_table'],
                             'columns': fk.get('columns', []),
                             'referenced_columns': fk.get('referenced_columns', []),
                             'constraint_name': fk.get('constraint_name', ''),
-                            'type': 'referenced_by'
-                        })
+                            'type': 'foreign_key'
+                        }
+                        for fk in schema[table_name].foreign_keys
+                    ],
+                    'referenced_by': []  # Otras tablas referencian a esta
+                }
 
-            return relationships
+            if not result:
+                return result
+
+            # Tablas que referencian a las pedidas (foreign keys entrantes)
+            for other_table_name, other_table in schema.items():
+                for fk in other_table.foreign_keys:
+                    target = result.get(fk['referenced_table'])
+                    if target is None or fk['referenced_table'] == other_table_name:
+                        continue
+                    target['referenced_by'].append({
+                        'table': other_table_name,
+                        'columns': fk.get('columns', []),
+                        'referenced_columns': fk.get('referenced_columns', []),
+                        'constraint_name': fk.get('constraint_name', ''),
+                        'type': 'referenced_by'
+                    })
+
+            return result
 
         except Exception as e:
-            logger.error(f"Error obteniendo relaciones de {table_name}", e)
+            logger.error(f"Error obteniendo relaciones de {', '.join(table_names[:5])}", e)
             return {}
     
+    def get_table_sample(self, table_name: str, limit: int = 10,
+                         timeout: Optional[float] = None) -> List[Tuple[Any, ...]]:
+        """
+        Obtener hasta `limit` filas de una tabla (muestra para las descripciones del RAG).
+
+        Las filas se devuelven como las tuplas del driver, sin copiarlas a listas:
+        los consumidores solo las indexan y transponen. Los errores se propagan sin
+        registrarse (una tabla sin muestra no es un error de conexión); el llamador decide.
+
+        Args:
+            timeout: Segundos máximos de la consulta en el servidor (Firebird 4+); al
+                vencer, la consulta se cancela y la conexión vuelve al pool
+        """
+        if not self._pool:
+            self.connect()
+
+        conn = self._pool.get_connection()
+        try:
+            cursor = conn.cursor()
+            statement = None
+            try:
+                query = f"SELECT FIRST {int(limit)} * FROM {_quote_identifier(table_name)}"
+                if timeout:
+                    statement = cursor.prepare(query)
+                    try:
+                        statement.timeout = timedelta(seconds=timeout)
+                    except Exception:
+                        # Servidor o driver sin timeout de sentencias (Firebird < 4)
+                        pass
+                    cursor.execute(statement)
+                else:
+                    cursor.execute(query)
+                return cursor.fetchmany(limit)
+            finally:
+                cursor.close()
+                if statement is not None:
+                    statement.free()
+        finally:
+            self._pool.return_connection(conn)
+    
     def close(self):
         """Cerrar todas las conexiones."""
         if self._pool:
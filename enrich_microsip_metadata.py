@@ -104,15 +104,14 @@ class MicroSIPMetadataEnricher:
                 # Obtener muestra de datos (solo primeras 100 tablas con datos)
                 if processed <= 100 and table_info.row_count != 0:
                     try:
-                        sample_query = f"SELECT FIRST 5 * FROM {table_name}"
-                        result = db.execute_query(sample_query)
-                        if result and result.data:
+                        sample_data = db.get_table_sample(table_name, 5)
+                        if sample_data:
                             # Analizar patrones en datos
                             patterns = TableDescriptor._analyze_data_patterns(
                                 table_info.columns,
-                                result.data
+                                sample_data
                             )
-                            analysis['data_patterns'] = patterns
+                            analysis['data_patterns'] = " | ".join(patterns)
                     except Exception as e:
                         logger.debug(f"  No se pudo analizar muestra de {table_name}: {str(e)[:50]}")
 
@@ -144,7 +143,7 @@ class MicroSIPMetadataEnricher:
     def _auto_categorize_table(self, table_name: str, columns: List[Dict], semantic_fields: List[str]) -> str:
         """Categorizar tabla automáticamente basándose en nombre y contenido."""
         name_lower = table_name.lower()
-        col_names = [col['name'].lower() for col in columns]
+        col_names = [col.get('name_lower') or col['name'].lower() for col in columns]
         col_names_str = ' '.join(col_names)
 
         # Prioridad: más específico primero
@@ -73,22 +73,9 @@ try:
     except ImportError:
         missing_deps.append("openai")
     
-    try:
-        import chromadb
-    except ImportError:
-        missing_deps.append("chromadb")
-    
-    try:
-        import sentence_transformers
-    except ImportError:
-        missing_deps.append("sentence-transformers")
-    
-    try:
-        import tf_keras # Import tf_keras for Keras 3 compatibility
-    except ImportError:
-        missing_deps.append("tf-keras")
-        # Add a placeholder for the user to install tf-keras
-        print("Por favor, instala la versión compatible de Keras: pip install tf-keras")
+    # chromadb/sentence-transformers ya no se usan: el catálogo de tablas vive en
+    # un índice NumPy/FAISS en memoria (schema_manager.VectorStore). No se importan
+    # aquí para no pagar su carga (ni la de TensorFlow vía tf-keras) al arrancar.
     
     try:
         import pandas
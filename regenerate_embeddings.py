@@ -9,6 +9,7 @@ Esto actualizará el sistema RAG con:
 
 import sys
 import time
+from config import config
 from schema_manager import schema_manager
 
 def main():
@@ -35,7 +36,9 @@ def main():
         print("🔄 Iniciando regeneración de embeddings...")
         print()
 
-        # Forzar recarga completa del esquema
+        # Forzar recarga completa del esquema y regenerar TODAS las descripciones
+        # (sin reutilizar las guardadas de tablas cuya estructura no cambió)
+        config.rag.reuse_table_descriptions = False
         schema_manager.load_and_process_schema(
             force_refresh=True,
             skip_embeddings=False
@@ -6,16 +6,55 @@ que utiliza embeddings vectoriales para encontrar las tablas más relevantes
 para una consulta específica.
 """
 
+import atexit
+import base64
+import bisect
 import json
+import math
 import os
+import re
 import time
+import random
+import hashlib
+import sqlite3
 import threading
-from typing import Dict, List, Tuple, Optional, Any
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Optional, Any, FrozenSet, NamedTuple
 from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import zip_longest, islice
+from operator import itemgetter
 
 import numpy as np
 import pandas as pd
-from openai import OpenAI
+from openai import OpenAI, DefaultHttpxClient, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+try:
+    import faiss  # Opcional: índice vectorial para esquemas grandes
+except ImportError:
+    faiss = None
+
+try:
+    import httpx  # Dependencia de openai; permite ajustar el pool de conexiones
+except ImportError:
+    httpx = None
+
+try:
+    import tiktoken  # Opcional: conteo exacto de tokens para empaquetar batches de embeddings
+except ImportError:
+    tiktoken = None
+
+try:
+    import zstandard  # Opcional: compresión de vectores en la caché de embeddings
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson  # Opcional: parseo JSON más rápido que la librería estándar
+except ImportError:
+    orjson = None
 
 from config import config, StatusMessages
 from database import db, TableInfo
@@ -232,72 +271,770 @@ BUSINESS_SYNONYMS = {
 }
 
 
+# ============================================================================
+# PATRONES PRECOMPILADOS DE PALABRAS CLAVE (TableDescriptor)
+# ============================================================================
+# Cada lista de palabras clave se compila una sola vez como alternancia regex:
+# `patron.search(texto)` equivale a `any(k in texto for k in palabras)` pero
+# el escaneo ocurre en C en una sola pasada.
+# ============================================================================
+
+def _keyword_pattern(keywords: List[str]) -> "re.Pattern":
+    """Compilar palabras clave en una alternancia que busca por subcadena."""
+    return re.compile('|'.join(map(re.escape, keywords)))
+
+
+class _OrderedKeywordMatcher:
+    """
+    Clasificar un texto por la palabra clave de mayor prioridad que contiene.
+
+    Equivale a recorrer `for keyword, value in items: if keyword in texto`,
+    pero en una sola pasada regex: el lookahead reporta en cada posición la
+    palabra de menor orden que inicia ahí, y el mínimo global es la primera
+    que habría encontrado el recorrido lineal.
+    """
+
+    def __init__(self, items: List[Tuple[str, Any]]):
+        self._values: Dict[str, Any] = {}
+        for keyword, value in items:
+            self._values.setdefault(keyword, value)
+        self._rank = {keyword: rank for rank, keyword in enumerate(self._values)}
+        self._pattern = re.compile('(?=(' + '|'.join(map(re.escape, self._values)) + '))')
+
+    def match(self, text: str) -> Optional[Any]:
+        """Valor asociado a la palabra clave ganadora, o None si no hay ninguna."""
+        matches = [m.group(1) for m in self._pattern.finditer(text)]
+        if not matches:
+            return None
+        return self._values[min(matches, key=self._rank.__getitem__)]
+
+
+# Detección de propósito de negocio por nombre de tabla (orden = prioridad)
+_BUSINESS_CATEGORY_MATCHER = _OrderedKeywordMatcher([
+    (keyword, category)
+    for category, keywords in [
+        ('venta', ['venta', 'factura', 'ticket', 'pos', 'doctos_pv', 'doctos_ve']),
+        ('cliente', ['cliente', 'customer']),
+        ('articulo', ['articulo', 'producto', 'item']),
+        ('inventario', ['existencia', 'inventario', 'stock']),
+        ('compra', ['compra', 'purchase', 'orden_compra']),
+        ('proveedor', ['proveedor', 'vendor', 'supplier']),
+        ('empleado', ['empleado', 'employee', 'personal', 'vendedor']),
+        ('pago', ['pago', 'cobranza', 'abono']),
+        ('catalogo', ['categoria', 'grupo', 'familia', 'linea', 'marca', 'tipo']),
+        ('config', ['config', 'parametro', 'param']),
+    ]
+    for keyword in keywords
+])
+_SALES_COLUMNS_PATTERN = _keyword_pattern(['importe', 'precio', 'unidades', 'cantidad'])
+
+# Términos de búsqueda por columnas presentes
+_STATUS_COLUMNS_PATTERN = _keyword_pattern(['estatus', 'status', 'activo', 'active'])
+_DATE_COLUMNS_PATTERN = _keyword_pattern(['fecha', 'date'])
+_MONEY_COLUMNS_PATTERN = _keyword_pattern(['importe', 'precio', 'monto'])
+_QUANTITY_COLUMNS_PATTERN = _keyword_pattern(['cantidad', 'unidades'])
+_HEADER_NAME_PATTERN = _keyword_pattern(['encab', 'header', 'docto'])
+
+_SEARCH_TERM_SYNONYMS = {
+    'venta': ['vender', 'vendido', 'transacción', 'ingreso', 'ticket', 'factura', 'cobro'],
+    'cliente': ['comprador', 'consumidor', 'usuario final', 'socio comercial'],
+    'articulo': ['producto', 'mercancía', 'ítem', 'SKU', 'inventario', 'activo', 'activos', 'disponible'],
+    'proveedor': ['vendor', 'supplier', 'abastecedor', 'distribuidor'],
+    'inventario': ['existencia', 'stock', 'almacén', 'bodega', 'disponible'],
+    'compra': ['adquisición', 'orden de compra', 'procurement', 'abastecimiento'],
+    'precio': ['costo', 'importe', 'valor', 'monto', 'tarifa'],
+    'pago': ['abono', 'cobranza', 'liquidación', 'transacción financiera'],
+    'empleado': ['trabajador', 'personal', 'colaborador', 'staff'],
+    'pedido': ['orden', 'solicitud', 'requerimiento', 'order'],
+    'factura': ['invoice', 'comprobante', 'documento fiscal'],
+}
+# Lookahead para reportar también claves solapadas dentro del nombre de tabla
+_SEARCH_TERM_KEYS_PATTERN = re.compile('(?=(' + '|'.join(map(re.escape, _SEARCH_TERM_SYNONYMS)) + '))')
+
+# Resumen semántico de columnas: (etiqueta, patrón, máximo de columnas listadas)
+_SEMANTIC_SUMMARY_PATTERNS = [
+    ("Identificadores", _keyword_pattern(['_id', 'codigo', 'cve_', 'clave']), 5),
+    ("Valores monetarios", _keyword_pattern(['precio', 'importe', 'costo', 'monto', 'total', 'subtotal']), 5),
+    ("Cantidades", _keyword_pattern(['cantidad', 'unidades', 'qty', 'existencia', 'stock']), 3),
+    ("Fechas", _keyword_pattern(['fecha', 'date', 'timestamp', 'hora']), 3),
+    ("Personas/Entidades", _keyword_pattern(['cliente', 'proveedor', 'empleado', 'vendedor', 'usuario']), 3),
+    ("Descripciones", _keyword_pattern(['nombre', 'descripcion', 'name', 'desc']), 3),
+]
+
+# Patrones de datos (_analyze_data_patterns)
+_SEQUENTIAL_ID_PATTERN = _keyword_pattern(['_id', 'id', 'folio', 'numero'])
+_PATTERN_MONEY_COLUMNS = _keyword_pattern(['precio', 'importe', 'total', 'costo', 'monto'])
+_AUDIT_COLUMNS_PATTERN = _keyword_pattern(['creado', 'modificado', 'usuario', 'created', 'updated'])
+
+# Tipos de dato por familia (_describe_sample_data_enriched)
+_SAMPLE_TEXT_TYPES = frozenset({'VARCHAR', 'CHAR'})
+_SAMPLE_NUMERIC_TYPES = frozenset({'INTEGER', 'SMALLINT', 'BIGINT', 'DECIMAL', 'NUMERIC'})
+_SAMPLE_DATE_TYPES = frozenset({'DATE', 'TIMESTAMP'})
+
+# Campos de búsqueda (_describe_key_fields)
+_SEARCH_FIELD_PATTERN = _keyword_pattern(['codigo', 'cve_', 'folio', 'numero'])
+
+# Tipo de tabla para patrones de consulta (_generate_query_patterns)
+_QUERY_SALES_TABLE_PATTERN = _keyword_pattern(['doctos_pv', 'ventas', 'factura', 'ticket'])
+_QUERY_SALES_DETAIL_PATTERN = _keyword_pattern(['pv', 'ventas'])
+_QUERY_ARTICLE_TABLE_PATTERN = _keyword_pattern(['articulo', 'producto'])
+_QUERY_INVENTORY_TABLE_PATTERN = _keyword_pattern(['inventario', 'existencia', 'saldo'])
+
+# Columnas clave: IDs y claves, nombres, fechas importantes, montos y cantidades
+_KEY_COLUMN_PATTERN = _keyword_pattern([
+    'id', 'key', 'codigo', 'code',
+    'nombre', 'name', 'descripcion', 'desc',
+    'fecha', 'date', 'time', 'created', 'updated',
+    'monto', 'amount', 'cantidad', 'qty', 'precio', 'price',
+])
+
+_FIELD_SEMANTIC_PATTERNS = {
+    semantic_category: _keyword_pattern(keywords)
+    for semantic_category, keywords in {
+        'identificación': ['id', 'codigo', 'code', 'clave', 'key', 'folio', 'numero'],
+        'nombres y descripciones': ['nombre', 'name', 'descripcion', 'desc', 'titulo', 'title'],
+        'fechas y tiempos': ['fecha', 'date', 'time', 'hora', 'timestamp', 'created', 'updated', 'modified'],
+        'importes y precios': ['precio', 'price', 'monto', 'amount', 'importe', 'costo', 'cost', 'total', 'subtotal'],
+        'cantidades': ['cantidad', 'qty', 'quantity', 'stock', 'existencia', 'unidades'],
+        'estados': ['status', 'estado', 'activo', 'active', 'vigente', 'eliminado', 'deleted'],
+        'personas': ['cliente', 'customer', 'proveedor', 'vendor', 'empleado', 'employee', 'usuario', 'user'],
+        'ubicaciones': ['direccion', 'address', 'ciudad', 'city', 'pais', 'country', 'zona', 'region', 'almacen', 'warehouse'],
+        'contacto': ['email', 'mail', 'telefono', 'phone', 'celular', 'mobile', 'contacto', 'contact'],
+        'financiero': ['pago', 'payment', 'saldo', 'balance', 'credito', 'credit', 'deuda', 'debt'],
+        'impuestos': ['iva', 'tax', 'impuesto', 'ieps', 'retencion'],
+        'documentos': ['factura', 'invoice', 'pedido', 'order', 'nota', 'recibo', 'receipt', 'documento', 'document'],
+    }.items()
+}
+
+
+class _ColumnClasses(NamedTuple):
+    """Clasificación precalculada de un nombre de columna."""
+    summary_labels: FrozenSet[str]  # Etiquetas de _SEMANTIC_SUMMARY_PATTERNS
+    semantic_types: FrozenSet[str]  # Categorías de _FIELD_SEMANTIC_PATTERNS
+    is_key: bool  # Coincide con _KEY_COLUMN_PATTERN
+    is_sequential_id: bool  # Candidata a ID secuencial (_SEQUENTIAL_ID_PATTERN)
+    is_monetary: bool  # Campo monetario (_PATTERN_MONEY_COLUMNS)
+    is_audit: bool  # Campo de auditoría (_AUDIT_COLUMNS_PATTERN)
+
+
+def _column_name_lower(col: Dict[str, Any]) -> str:
+    """Nombre de columna en minúsculas (precalculado por database.py en 'name_lower' si existe)."""
+    return col.get('name_lower') or col['name'].lower()
+
+
+@lru_cache(maxsize=16384)
+def _classify_column(name_lower: str) -> _ColumnClasses:
+    """
+    Clasificar un nombre de columna (en minúsculas) contra todos los patrones.
+
+    Los nombres se repiten mucho entre tablas (ARTICULO_ID, FECHA, NOMBRE...),
+    así que cada nombre distinto se evalúa una sola vez por proceso.
+    """
+    return _ColumnClasses(
+        summary_labels=frozenset(label for label, pattern, _ in _SEMANTIC_SUMMARY_PATTERNS
+                                 if pattern.search(name_lower)),
+        semantic_types=frozenset(category for category, pattern in _FIELD_SEMANTIC_PATTERNS.items()
+                                 if pattern.search(name_lower)),
+        is_key=_KEY_COLUMN_PATTERN.search(name_lower) is not None,
+        is_sequential_id=_SEQUENTIAL_ID_PATTERN.search(name_lower) is not None,
+        is_monetary=_PATTERN_MONEY_COLUMNS.search(name_lower) is not None,
+        is_audit=_AUDIT_COLUMNS_PATTERN.search(name_lower) is not None,
+    )
+
+# Propósito de tabla por nombre: gana la primera palabra clave (en orden del
+# diccionario) contenida en el nombre.
+_TABLE_PURPOSE_KEYWORDS = {
+    # Comercial y ventas
+    'ventas': 'ventas y transacciones comerciales',
+    'venta': 'ventas y transacciones comerciales',
+    'facturas': 'facturación',
+    'factura': 'facturación',
+    'pedidos': 'gestión de pedidos',
+    'pedido': 'gestión de pedidos',
+    'cotizaciones': 'cotizaciones y presupuestos',
+    'cotizacion': 'cotizaciones y presupuestos',
+    'remisiones': 'remisiones y entregas',
+    'remision': 'remisiones y entregas',
+
+    # Clientes y proveedores
+    'clientes': 'información de clientes',
+    'cliente': 'información de clientes',
+    'proveedores': 'información de proveedores',
+    'proveedor': 'información de proveedores',
+    'contactos': 'contactos y relaciones',
+    'contacto': 'contactos y relaciones',
+
+    # Productos e inventario
+    'productos': 'catálogo de productos y artículos',
+    'producto': 'catálogo de productos y artículos',
+    'articulos': 'catálogo de productos y artículos',
+    'articulo': 'catálogo de productos y artículos',
+    'items': 'catálogo de productos y artículos',
+    'inventario': 'control de inventarios y existencias',
+    'existencias': 'control de inventarios y existencias',
+    'stock': 'control de inventarios y existencias',
+    'almacen': 'gestión de almacenes',
+    'almacenes': 'gestión de almacenes',
+    'bodega': 'gestión de almacenes',
+    'bodegas': 'gestión de almacenes',
+    'movimientos': 'movimientos de inventario',
+    'movimiento': 'movimientos de inventario',
+
+    # Personal
+    'empleados': 'información de empleados',
+    'empleado': 'información de empleados',
+    'personal': 'información de empleados',
+    'usuarios': 'gestión de usuarios',
+    'usuario': 'gestión de usuarios',
+
+    # Financiero
+    'pagos': 'gestión de pagos',
+    'pago': 'gestión de pagos',
+    'cobranza': 'cobranza y cuentas por cobrar',
+    'cobranzas': 'cobranza y cuentas por cobrar',
+    'cuentas': 'cuentas y contabilidad',
+    'cuenta': 'cuentas y contabilidad',
+    'movtos': 'movimientos financieros',
+    'bancos': 'movimientos bancarios',
+    'banco': 'movimientos bancarios',
+
+    # Catálogos
+    'categorias': 'categorización y clasificación',
+    'categoria': 'categorización y clasificación',
+    'grupos': 'agrupación y clasificación',
+    'grupo': 'agrupación y clasificación',
+    'tipos': 'tipos y clasificaciones',
+    'tipo': 'tipos y clasificaciones',
+    'familias': 'familias de productos',
+    'familia': 'familias de productos',
+    'lineas': 'líneas de productos',
+    'linea': 'líneas de productos',
+    'marcas': 'marcas de productos',
+    'marca': 'marcas de productos',
+
+    # Ubicación
+    'zonas': 'zonas geográficas',
+    'zona': 'zonas geográficas',
+    'rutas': 'rutas de distribución',
+    'ruta': 'rutas de distribución',
+    'sucursales': 'sucursales y ubicaciones',
+    'sucursal': 'sucursales y ubicaciones',
+
+    # Sistema
+    'logs': 'registro de eventos y auditoría',
+    'log': 'registro de eventos y auditoría',
+    'configuracion': 'configuración del sistema',
+    'config': 'configuración del sistema',
+    'parametros': 'parámetros del sistema',
+    'parametro': 'parámetros del sistema',
+    'reportes': 'generación de reportes',
+    'reporte': 'generación de reportes',
+    'audit': 'auditoría del sistema',
+    'auditoria': 'auditoría del sistema',
+    'temp': 'datos temporales',
+    'temporal': 'datos temporales',
+    'backup': 'respaldo de datos',
+    'respaldo': 'respaldo de datos',
+
+    # Documentos
+    'documentos': 'documentos y archivos',
+    'documento': 'documentos y archivos',
+    'notas': 'notas y comentarios',
+    'nota': 'notas y comentarios',
+
+    # Procesos
+    'compras': 'compras y adquisiciones',
+    'compra': 'compras y adquisiciones',
+    'produccion': 'producción y manufactura',
+    'ordenes': 'órdenes de trabajo',
+    'orden': 'órdenes de trabajo',
+}
+_TABLE_PURPOSE_MATCHER = _OrderedKeywordMatcher(list(_TABLE_PURPOSE_KEYWORDS.items()))
+
+
+# Dimensiones de text-embedding-3-small
+EMBEDDING_DIMENSIONS = 1536
+# Filas por bloque al escanear matrices fp16/int8 (256 x 1536 x 4 bytes ≈ 1.5 MB, cabe en caché)
+_SCAN_BLOCK_ROWS = 256
+
+
+def _json_default(obj: Any) -> Any:
+    """Serializar tipos numpy (embeddings float32) al guardar JSON."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Objeto de tipo {type(obj).__name__} no es serializable a JSON")
+
+
+def _decode_embedding(value: Any) -> np.ndarray:
+    """Convertir un embedding de la API (base64 float32 o lista de floats) a vector float32."""
+    if isinstance(value, str):
+        return np.frombuffer(base64.b64decode(value), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _load_json_file(path: str) -> Any:
+    """Leer y parsear un archivo JSON (usa orjson si está disponible)."""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _dump_json_file(path: str, data: Any):
+    """Escribir JSON compacto UTF-8 (usa orjson si está disponible; serializa tipos numpy)."""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, default=_json_default)
+
+
+class EmbeddingCache:
+    """
+    Caché persistente de embeddings en SQLite, indexado por hash del contenido.
+
+    La clave es SHA-256 de (modelo, texto) y el vector se guarda como bytes
+    (float16 por defecto, comprimido con zstd si está instalado), de modo que
+    re-indexar un esquema sin cambios no vuelve a llamar a la API de OpenAI.
+    La columna `codec` indica el formato de cada fila; las filas float32 de
+    versiones anteriores se siguen leyendo.
+    """
+
+    def __init__(self, db_path: str = None, model: str = "text-embedding-3-small"):
+        self.db_path = db_path or os.path.join(config.rag.vector_db_path, "embedding_cache.sqlite3")
+        self.model = model
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Abrir conexión lazy y crear tabla si no existe."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # WAL + synchronous=NORMAL: cada lote de set_many confirma sin esperar
+            # un fsync completo (la caché se puede regenerar si se pierde lo último)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key BLOB PRIMARY KEY, vec BLOB NOT NULL, codec TEXT NOT NULL DEFAULT 'f32')"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+            if 'codec' not in columns:
+                # Caché creada antes de soportar float16: sus filas son float32
+                self._conn.execute("ALTER TABLE embeddings ADD COLUMN codec TEXT NOT NULL DEFAULT 'f32'")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _encode(embedding: Any) -> Tuple[bytes, str]:
+        """Serializar un vector según config.rag.embedding_cache_fp16. Retorna (bytes, codec)."""
+        if not config.rag.embedding_cache_fp16:
+            return np.asarray(embedding, dtype=np.float32).tobytes(), 'f32'
+        data = np.asarray(embedding, dtype=np.float16).tobytes()
+        if zstandard is not None:
+            return zstandard.compress(data, 3), 'f16zst'
+        return data, 'f16'
+
+    @staticmethod
+    def _decode(blob: bytes, codec: str) -> np.ndarray:
+        """Reconstruir el vector float32 a partir de los bytes guardados."""
+        if codec == 'f32':
+            return np.frombuffer(blob, dtype=np.float32)
+        if codec == 'f16zst':
+            blob = zstandard.decompress(blob)
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}|{text}".encode('utf-8')).digest()
+
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """Buscar textos en caché. Retorna {índice en texts: embedding} solo para los aciertos."""
+        if not texts:
+            return {}
+
+        keys = [self._key(text) for text in texts]
+        found = {}
+
+        try:
+            with self._lock:
+                conn = self._get_conn()
+                # SQLite limita el número de parámetros por sentencia
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT key, vec, codec FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                    found.update((key, (vec, codec)) for key, vec, codec in rows)
+        except Exception as e:
+            logger.warning(f"No se pudo leer caché de embeddings: {e}")
+            return {}
+
+        result = {}
+        for idx, key in enumerate(keys):
+            if key in found:
+                try:
+                    result[idx] = self._decode(*found[key])
+                except Exception as e:
+                    # p.ej. fila comprimida con zstd sin el paquete instalado: tratar como fallo
+                    logger.debug(f"Entrada de caché de embeddings ilegible: {e}")
+        return result
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Buscar un solo texto en caché."""
+        return self.get_many([text]).get(0)
+
+    def set_many(self, texts: List[str], embeddings: np.ndarray):
+        """Guardar embeddings en caché (reemplaza entradas existentes)."""
+        if not texts:
+            return
+
+        rows = [
+            (self._key(text), *self._encode(embedding))
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+        try:
+            with self._lock:
+                conn = self._get_conn()
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, vec, codec) VALUES (?, ?, ?)", rows)
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"No se pudo guardar caché de embeddings: {e}")
+
+
+class QueryEmbeddingCache:
+    """
+    Caché LRU en memoria, con TTL, de embeddings de consultas (thread-safe).
+
+    Evita la consulta a SQLite y la decodificación de EmbeddingCache cuando el
+    usuario repite una consulta (reintentos, paginación). La clave se normaliza
+    con NFKC, espacios colapsados y en minúsculas.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 600):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return ' '.join(unicodedata.normalize('NFKC', query).lower().split())
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = self.normalize(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, embedding = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return embedding
+
+    def set(self, query: str, embedding: np.ndarray):
+        key = self.normalize(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _build_http_client():
+    """
+    Crear cliente HTTP con pool keep-alive dimensionado para los batches concurrentes.
+
+    Returns:
+        Cliente httpx para OpenAI, o None para usar el cliente por defecto
+    """
+    if httpx is None:
+        return None
+
+    max_connections = config.rag.embedding_max_connections
+    options = {
+        'limits': httpx.Limits(max_connections=max_connections,
+                               max_keepalive_connections=max_connections),
+        'timeout': httpx.Timeout(60.0, connect=10.0),
+    }
+    if config.rag.embedding_http2:
+        try:
+            return DefaultHttpxClient(http2=True, **options)
+        except ImportError:
+            logger.debug("Paquete h2 no disponible, usando HTTP/1.1 para embeddings")
+    return DefaultHttpxClient(**options)
+
+
+@lru_cache(maxsize=4)
+def _get_openai_client(api_key: str) -> OpenAI:
+    """
+    Cliente OpenAI compartido por proceso (uno por API key).
+
+    Evita que cada EmbeddingGenerator cree su propio cliente y pool HTTP.
+    """
+    logger.info("Inicializando cliente OpenAI para embeddings (text-embedding-3-small)")
+    client = OpenAI(api_key=api_key, http_client=_build_http_client())
+    logger.info("Cliente OpenAI inicializado correctamente")
+    return client
+
+
 class EmbeddingGenerator:
     """Generador de embeddings usando OpenAI API directamente (hardcodeado)."""
 
     def __init__(self):
         self.openai_client = None
+        self._create_embeddings = None  # Método embeddings.create ya resuelto (None = sin cliente)
         self._model_lock = threading.Lock()
+        self.cache = EmbeddingCache()
+        self._encoding = None  # Codificador tiktoken, cargado al primer uso
+        # Contadores acumulados de generate_batch_embeddings: textos servidos desde la caché
+        # persistente y textos únicos enviados a la API
+        self.batch_stats = {'cache_hits': 0, 'api_texts': 0}
+        self._stats_lock = threading.Lock()
 
     def _load_model(self):
-        """Cargar cliente de OpenAI lazy loading."""
-        if self.openai_client is None:
-            with self._model_lock:
-                if self.openai_client is None:
-                    logger.info("Inicializando cliente OpenAI para embeddings (text-embedding-3-small)")
-                    # HARDCODED: Usar API key de config
-                    self.openai_client = OpenAI(api_key=config.ai.api_key)
-                    logger.info("Cliente OpenAI inicializado correctamente")
-
-    def generate_embedding(self, text: str) -> List[float]:
-        """Generar embedding para un texto usando OpenAI API."""
-        self._load_model()
+        """
+        Cargar cliente de OpenAI lazy loading (solo al primer request real).
+
+        El cliente se comparte a nivel de proceso (ver `_get_openai_client`),
+        así varias instancias reutilizan el mismo pool de conexiones.
 
+        Returns:
+            Método embeddings.create del cliente, resuelto una sola vez
+        """
+        create = self._create_embeddings
+        if create is not None:
+            return create
+
+        with self._model_lock:
+            if self._create_embeddings is None:
+                # HARDCODED: Usar API key de config
+                self.openai_client = _get_openai_client(config.ai.api_key)
+                self._create_embeddings = self.openai_client.embeddings.create
+            return self._create_embeddings
+
+    def generate_embedding(self, text: str) -> np.ndarray:
+        """Generar embedding float32 para un texto usando OpenAI API (con caché persistente)."""
         if not text or not text.strip():
-            return [0.0] * 1536  # Dimensiones de text-embedding-3-small
+            return np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+
+        clean_text = text.strip()
+        cached = self.cache.get(clean_text)
+        if cached is not None:
+            return cached
 
         try:
             # Llamada directa a OpenAI API v1.0+
-            response = self.openai_client.embeddings.create(
+            create = self._load_model()
+            response = create(
                 model="text-embedding-3-small",
-                input=text.strip()
+                input=clean_text,
+                encoding_format="base64"
             )
-            return response.data[0].embedding
+            embedding = _decode_embedding(response.data[0].embedding)
+            self.cache.set_many([clean_text], [embedding])
+            return embedding
         except Exception as e:
             logger.error(f"Error generando embedding: {e}")
-            return [0.0] * 1536
+            return np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
 
-    def generate_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generar embeddings para múltiples textos usando OpenAI API (hasta 100 textos por batch)."""
-        self._load_model()
+    def generate_batch_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Generar embeddings para múltiples textos usando OpenAI API.
 
+        Los textos se agrupan en batches por tokens y cantidad que se envían
+        en paralelo con concurrencia acotada. Retorna una matriz float32
+        (len(texts), 1536) cuyas filas siguen el orden de entrada.
+        """
         if not texts:
-            return []
+            return np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
 
         # Filtrar textos vacíos
         clean_texts = [text.strip() if text else " " for text in texts]
 
-        try:
-            # OpenAI permite hasta 100 embeddings por request
-            all_embeddings = []
-            batch_size = 100
+        # Resultado pre-asignado: cada batch escribe en sus propias filas
+        # (las de batches fallidos quedan en cero)
+        all_embeddings = np.zeros((len(clean_texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+        # Reutilizar embeddings ya calculados; solo se envían a la API los faltantes
+        cached = self.cache.get_many(clean_texts)
+        for idx, embedding in cached.items():
+            all_embeddings[idx] = embedding
+
+        miss_indices = [i for i in range(len(clean_texts)) if i not in cached]
+        if cached:
+            logger.info(f"♻️ {len(cached)}/{len(clean_texts)} embeddings obtenidos de caché")
+        with self._stats_lock:
+            self.batch_stats['cache_hits'] += len(cached)
+        if not miss_indices:
+            return all_embeddings
 
-            for i in range(0, len(clean_texts), batch_size):
-                batch = clean_texts[i:i + batch_size]
+        # Textos idénticos (p.ej. tablas vacías *_BAK/*_TMP) se envían una sola vez
+        positions_by_text: Dict[str, List[int]] = {}
+        for idx in miss_indices:
+            positions_by_text.setdefault(clean_texts[idx], []).append(idx)
+        miss_texts = list(positions_by_text)
+        if len(miss_texts) < len(miss_indices):
+            logger.info(f"🔁 {len(miss_indices) - len(miss_texts)} textos duplicados reutilizan embedding")
+        with self._stats_lock:
+            self.batch_stats['api_texts'] += len(miss_texts)
+
+        batches = self._pack_batches(miss_texts)
+        create = self._load_model()
+
+        max_workers = max(1, min(config.rag.embedding_max_workers, len(batches)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embeddings") as executor:
+            futures = {}
+            for _, batch in batches:
+                # Jitter para no disparar todos los requests a la vez (evita ráfagas de 429)
+                if len(batches) > 1:
+                    time.sleep(random.uniform(0, 0.05))
+                futures[executor.submit(self._embed_batch_with_retry, create, batch)] = batch
+
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    batch_embeddings = future.result()
+                    self.cache.set_many(batch, batch_embeddings)
+                except Exception as e:
+                    logger.error(f"Error generando batch de embeddings ({len(batch)} textos): {e}")
+                    continue
 
-                response = self.openai_client.embeddings.create(
-                    model="text-embedding-3-small",
-                    input=batch
-                )
+                for text, embedding in zip(batch, batch_embeddings):
+                    all_embeddings[positions_by_text[text]] = embedding
 
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
+        return all_embeddings
 
-            return all_embeddings
+    def _count_tokens(self, texts: List[str]) -> List[int]:
+        """Contar tokens por texto (tiktoken si está instalado, si no una estimación conservadora)."""
+        if tiktoken is not None:
+            try:
+                if self._encoding is None:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+                return [len(tokens) for tokens in self._encoding.encode_batch(texts, disallowed_special=())]
+            except Exception as e:
+                logger.debug(f"No se pudieron contar tokens con tiktoken: {e}")
+        # ~3 caracteres por token en español es una cota segura para no exceder el límite
+        return [len(text) // 3 + 1 for text in texts]
 
-        except Exception as e:
-            logger.error(f"Error generando batch de embeddings: {e}")
-            return [[0.0] * 1536 for _ in clean_texts]
+    def _pack_batches(self, texts: List[str]) -> List[Tuple[int, List[str]]]:
+        """
+        Agrupar textos consecutivos en batches limitados por tokens y por cantidad.
+
+        Returns:
+            Lista de (índice inicial, textos del batch)
+        """
+        max_items = config.rag.embedding_batch_size
+        max_tokens = config.rag.embedding_batch_max_tokens
+
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, n_tokens in enumerate(self._count_tokens(texts)):
+            # Un texto que por sí solo excede el límite va en su propio batch
+            if i > start and (i - start >= max_items or batch_tokens + n_tokens > max_tokens):
+                batches.append((start, texts[start:i]))
+                start = i
+                batch_tokens = 0
+            batch_tokens += n_tokens
+        if start < len(texts):
+            batches.append((start, texts[start:]))
+        return batches
+
+    def _embed_batch_with_retry(self, create, batch: List[str]) -> np.ndarray:
+        """Enviar un batch a OpenAI con reintentos y backoff exponencial (respeta Retry-After)."""
+        max_retries = config.rag.embedding_max_retries
+
+        for attempt in range(max_retries + 1):
+            try:
+                response = create(
+                    model="text-embedding-3-small",
+                    input=batch,
+                    encoding_format="base64"
+                )
+                vectors = np.empty((len(response.data), EMBEDDING_DIMENSIONS), dtype=np.float32)
+                for row, item in enumerate(response.data):
+                    vectors[row] = _decode_embedding(item.embedding)
+                return vectors
+            except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError) as e:
+                if attempt >= max_retries:
+                    raise
+                delay = self._get_retry_delay(e, attempt)
+                logger.warning(f"Reintentando batch de embeddings en {delay:.1f}s "
+                               f"(intento {attempt + 1}/{max_retries}): {e}")
+                time.sleep(delay)
+
+    @staticmethod
+    def _get_retry_delay(error: Exception, attempt: int) -> float:
+        """Calcular espera antes de reintentar: Retry-After si viene en la respuesta, si no backoff exponencial."""
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = response.headers.get('retry-after')
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return (2 ** attempt) + random.uniform(0, 0.5)
+
+
+# Incrementar al cambiar el formato de TableDescriptor.describe_table para invalidar
+# las descripciones guardadas con _description_fingerprint
+_DESCRIPTION_FORMAT_VERSION = 4
+
+# Claves de columna derivadas de otras (no son estructura): no entran en la huella
+_DERIVED_COLUMN_KEYS = frozenset({'name_lower'})
+
+
+def _description_fingerprint(table_info: TableInfo) -> str:
+    """
+    Huella de lo que determina la descripción de una tabla, salvo el número exacto de registros.
+
+    Incluye columnas, PK, FK, índices, los segmentos del diccionario de MicroSIP, si la
+    tabla tiene datos (segmento de volumen) y si la descripción lleva muestra de datos.
+    El contenido de la muestra no entra: con config.rag.include_sample_data no se reutiliza.
+    """
+    TableDescriptor._load_microsip_dict()
+    key = repr((
+        _DESCRIPTION_FORMAT_VERSION,
+        table_info.name,
+        TableDescriptor._ms_segments.get(table_info.name.upper(), ()),
+        [sorted(item for item in col.items() if item[0] not in _DERIVED_COLUMN_KEYS)
+         for col in table_info.columns],
+        table_info.primary_keys,
+        [sorted(fk.items()) for fk in table_info.foreign_keys],
+        [(idx.get('name'), idx.get('unique', False), [col.get('name') for col in idx.get('columns', [])])
+         for idx in table_info.indexes],
+        table_info.row_count > 0,
+        config.rag.include_sample_data and table_info.row_count != 0
+    ))
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _init_describe_worker():
+    """Inicializador de procesos: cargar el diccionario de MicroSIP una vez por proceso."""
+    TableDescriptor._load_microsip_dict()
+
+
+def _describe_table_safe(table_info: TableInfo, sample_data: List[List[Any]]) -> Optional[str]:
+    """Describir una tabla sin propagar errores (usable desde ProcessPoolExecutor)."""
+    try:
+        return TableDescriptor.describe_table(table_info, sample_data)
+    except Exception as e:
+        logger.error(f"✗ Error describiendo tabla {table_info.name}: {str(e)}")
+        return None
 
 
 class TableDescriptor:
@@ -305,85 +1042,151 @@ class TableDescriptor:
     
     # Cargar diccionario de MicroSIP si existe
     _microsip_dict = None
-    
+    # Segmentos de descripción ya formateados por tabla conocida: {TABLA: (categoría, búsquedas)}
+    _ms_segments: Dict[str, Tuple[str, ...]] = {}
+    _microsip_lock = threading.Lock()
+
     @classmethod
     def _load_microsip_dict(cls):
-        """Cargar diccionario de MicroSIP una sola vez."""
+        """Cargar diccionario de MicroSIP una sola vez (thread-safe)."""
         if cls._microsip_dict is None:
-            try:
-                import os
-                dict_path = os.path.join(os.path.dirname(__file__), 'microsip_dictionary.json')
-                if os.path.exists(dict_path):
-                    with open(dict_path, 'r', encoding='utf-8') as f:
-                        cls._microsip_dict = json.load(f)
-                        logger.info("Diccionario de MicroSIP cargado exitosamente")
-                else:
-                    cls._microsip_dict = {}
-            except Exception as e:
-                logger.warning(f"No se pudo cargar diccionario de MicroSIP: {e}")
-                cls._microsip_dict = {}
+            with cls._microsip_lock:
+                if cls._microsip_dict is None:
+                    data = {}
+                    try:
+                        dict_path = os.path.join(os.path.dirname(__file__), 'microsip_dictionary.json')
+                        if os.path.exists(dict_path):
+                            data = _load_json_file(dict_path)
+                            logger.info("Diccionario de MicroSIP cargado exitosamente")
+                    except Exception as e:
+                        logger.warning(f"No se pudo cargar diccionario de MicroSIP: {e}")
+                        data = {}
+
+                    cls._ms_segments = cls._build_microsip_segments(data)
+                    # Asignar al final: otros hilos solo leen las vistas cuando esto ya no es None
+                    cls._microsip_dict = data
         return cls._microsip_dict
+
+    @staticmethod
+    def _build_microsip_segments(data: Dict[str, Any]) -> Dict[str, Tuple[str, ...]]:
+        """Precalcular los segmentos de MicroSIP que describe_table agrega por tabla (claves en mayúsculas)."""
+        keywords_by_table = {name.upper(): keywords for name, keywords in data.get('keywords_busqueda', {}).items()}
+        segments = {}
+        for name, info in data.get('tablas', {}).items():
+            name_upper = name.upper()
+            parts = []
+            categoria = info.get('categoria', '')
+            if categoria and categoria != 'OTROS':
+                parts.append(f"Categoría: {categoria.lower().replace('_', ' ')}")
+            keywords = keywords_by_table.get(name_upper)
+            if keywords is not None:
+                parts.append(f"Búsquedas comunes: {', '.join(keywords[:10])}")
+            segments[name_upper] = tuple(parts)
+        return segments
     
+    @staticmethod
+    def create_description_pool(total: int) -> Optional[ProcessPoolExecutor]:
+        """
+        Pool de procesos para describir `total` tablas, o None si no compensa.
+
+        El llamador lo reutiliza entre bloques y lo cierra con shutdown().
+        """
+        workers = config.rag.description_workers or os.cpu_count() or 1
+        if total < config.rag.description_parallel_min_tables or workers <= 1:
+            return None
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_describe_worker)
+            logger.info(f"📝 Descripciones de {total} tablas con {workers} procesos")
+            return executor
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo crear el pool de procesos para descripciones: {e}")
+            return None
+
+    @classmethod
+    def describe_tables_bulk(cls, table_infos: List[TableInfo],
+                             sample_data_list: List[List[List[Any]]] = None,
+                             executor: Optional[ProcessPoolExecutor] = None) -> List[Optional[str]]:
+        """
+        Generar descripciones de muchas tablas, en paralelo con procesos si son suficientes.
+
+        Args:
+            table_infos: Tablas a describir
+            sample_data_list: Muestra de datos por tabla (mismo orden que table_infos)
+            executor: Pool de create_description_pool compartido entre llamadas; sin él se
+                crea uno temporal si hay al menos config.rag.description_parallel_min_tables
+
+        Returns:
+            Lista de descripciones alineada con table_infos (None si falló la tabla)
+        """
+        if sample_data_list is None:
+            sample_data_list = [[] for _ in table_infos]
+
+        own_executor = executor is None
+        if own_executor:
+            executor = cls.create_description_pool(len(table_infos))
+
+        if executor is not None:
+            try:
+                return list(executor.map(_describe_table_safe, table_infos,
+                                         sample_data_list, chunksize=32))
+            except Exception as e:
+                logger.warning(f"⚠️ Falló la generación paralela de descripciones, usando modo secuencial: {e}")
+            finally:
+                if own_executor:
+                    executor.shutdown(wait=True)
+
+        cls._load_microsip_dict()
+        return [_describe_table_safe(table_info, sample_data)
+                for table_info, sample_data in zip(table_infos, sample_data_list)]
+
     @classmethod
     def describe_table(cls, table_info: TableInfo, sample_data: List[List[Any]] = None) -> str:
         """Generar descripción semántica enriquecida de una tabla."""
         description_parts = []
 
         # Cargar diccionario de MicroSIP
-        microsip_dict = cls._load_microsip_dict()
+        cls._load_microsip_dict()
 
         # Nombre de tabla procesado
-        table_name = table_info.name.lower()
+        table_name = table_info.name_lower
         table_name_upper = table_info.name.upper()
 
+        # Nombres de columna en minúsculas, calculados una vez para todos los helpers.
+        # Unidos con salto de línea (no aparece en nombres) para buscar palabras clave de una pasada
+        col_names_lower = [_column_name_lower(col) for col in table_info.columns]
+        col_names_str = '\n'.join(col_names_lower)
+
         # === PARTE 1: PROPÓSITO DE NEGOCIO (lo más importante para embeddings) ===
-        business_purpose = cls._infer_business_purpose(table_name, table_info.columns)
+        business_purpose = cls._infer_business_purpose(table_name, table_info.columns, col_names_str)
         if business_purpose:
             description_parts.append(business_purpose)
 
-        # Información de MicroSIP para keywords adicionales
-        if microsip_dict and 'tablas' in microsip_dict and table_name_upper in microsip_dict['tablas']:
-            ms_info = microsip_dict['tablas'][table_name_upper]
-            categoria = ms_info.get('categoria', '')
-
-            if categoria and categoria != 'OTROS':
-                description_parts.append(f"Categoría: {categoria.lower().replace('_', ' ')}")
+        # Información de MicroSIP (categoría y keywords de búsqueda) ya formateada
+        description_parts.extend(cls._ms_segments.get(table_name_upper, ()))
 
-            # Agregar keywords de búsqueda de MicroSIP
-            if 'keywords_busqueda' in microsip_dict and table_name_upper in microsip_dict['keywords_busqueda']:
-                keywords = microsip_dict['keywords_busqueda'][table_name_upper][:10]
-                description_parts.append(f"Búsquedas comunes: {', '.join(keywords)}")
+        # Los helpers devuelven segmentos; todo se une una sola vez al final
 
         # === PARTE 2: ANÁLISIS SEMÁNTICO DE CONTENIDO ===
-        semantic_summary = cls._generate_semantic_summary(table_info.columns)
-        if semantic_summary:
-            description_parts.append(semantic_summary)
+        description_parts.extend(cls._generate_semantic_summary(table_info.columns))
 
         # === PARTE 3: DATOS DE MUESTRA (si están disponibles) ===
         if sample_data and table_info.columns:
-            sample_desc = cls._describe_sample_data_enriched(table_info.columns, sample_data)
-            if sample_desc:
-                description_parts.append(f"Ejemplos: {sample_desc}")
+            description_parts.extend(cls._prefix_first(
+                "Ejemplos: ", cls._describe_sample_data_enriched(table_info.columns, sample_data)))
 
             # Análisis de patrones avanzados
-            patterns = cls._analyze_data_patterns(table_info.columns, sample_data)
-            if patterns:
-                description_parts.append(f"Características: {patterns}")
+            description_parts.extend(cls._prefix_first(
+                "Características: ", cls._analyze_data_patterns(table_info.columns, sample_data, col_names_lower)))
 
         # === PARTE 4: RELACIONES Y CONTEXTO ===
-        relationship_desc = cls._describe_relationships(table_info.foreign_keys)
-        if relationship_desc:
-            description_parts.append(relationship_desc)
+        description_parts.extend(cls._describe_relationships(table_info.foreign_keys))
 
         # === PARTE 5: CAMPOS CLAVE ===
-        key_fields_desc = cls._describe_key_fields(table_info.columns, table_info.primary_keys)
-        if key_fields_desc:
-            description_parts.append(key_fields_desc)
+        description_parts.extend(cls._describe_key_fields(table_info.columns, table_info.primary_keys))
 
         # === PARTE 6: PATRONES DE CONSULTA SQL COMUNES ===
-        query_patterns = cls._generate_query_patterns(table_info.name, table_info.columns, table_info.primary_keys)
-        if query_patterns:
-            description_parts.append(query_patterns)
+        description_parts.extend(
+            cls._generate_query_patterns(table_info.name, table_info.columns, table_info.primary_keys))
 
         # === PARTE 7: METADATOS TÉCNICOS (menos peso para embeddings) ===
         if table_info.row_count > 0:
@@ -394,31 +1197,40 @@ class TableDescriptor:
         # Unir con separadores optimizados para modelos de embeddings
         # El separador " | " ayuda a que el modelo sentence-transformer
         # mantenga la estructura semántica de cada segmento
-        full_description = " | ".join(description_parts)
-
         # Agregar sinónimos y términos de búsqueda para mejorar recall
-        search_terms = cls._generate_search_terms(table_name, table_info.columns)
+        search_terms = cls._generate_search_terms(table_name, table_info.columns, col_names_str)
         if search_terms:
-            full_description += f" | Términos: {search_terms}"
+            description_parts.append(f"Términos: {search_terms}")
 
-        return full_description
+        return " | ".join(description_parts)
+
+    @staticmethod
+    def _prefix_first(prefix: str, segments: List[str]) -> List[str]:
+        """Anteponer una etiqueta al primer segmento de una sección."""
+        if segments:
+            segments[0] = prefix + segments[0]
+        return segments
     
     @staticmethod
-    def _infer_business_purpose(table_name: str, columns: List[Dict[str, Any]]) -> str:
+    def _infer_business_purpose(table_name: str, columns: List[Dict[str, Any]],
+                                col_names_str: str = None) -> str:
         """
         Inferir el propósito de negocio combinando nombre de tabla y análisis de columnas.
         Genera descripciones orientadas al negocio, no técnicas.
         """
         name_lower = table_name.lower()
-        col_names = [col['name'].lower() for col in columns]
-        col_names_str = ' '.join(col_names)
+        if col_names_str is None:
+            col_names_str = '\n'.join(_column_name_lower(col) for col in columns)
 
         # Detectar tipo de tabla por patrón de columnas + nombre
         purposes = []
 
+        # Una sola pasada sobre el nombre decide la categoría (primera coincidencia por prioridad)
+        category = _BUSINESS_CATEGORY_MATCHER.match(name_lower)
+
         # Transacciones de venta
-        if any(k in name_lower for k in ['venta', 'factura', 'ticket', 'pos', 'doctos_pv', 'doctos_ve']):
-            if any(k in col_names_str for k in ['importe', 'precio', 'unidades', 'cantidad']):
+        if category == 'venta':
+            if _SALES_COLUMNS_PATTERN.search(col_names_str):
                 purposes.append("Registra transacciones de venta")
                 if 'det' in name_lower or 'detalle' in name_lower:
                     purposes.append("Detalle de productos vendidos en cada operación")
@@ -426,13 +1238,13 @@ class TableDescriptor:
                     purposes.append("Encabezado de documentos de venta con cliente, fecha y totales")
 
         # Clientes
-        elif any(k in name_lower for k in ['cliente', 'customer']):
+        elif category == 'cliente':
             purposes.append("Información de clientes y compradores")
             if 'direccion' in col_names_str or 'domicilio' in col_names_str:
                 purposes.append("Incluye datos de contacto y ubicación")
 
         # Productos/Artículos
-        elif any(k in name_lower for k in ['articulo', 'producto', 'item']):
+        elif category == 'articulo':
             purposes.append("Catálogo de productos y artículos comercializados")
             if 'precio' in col_names_str:
                 purposes.append("Contiene precios y características de venta")
@@ -440,37 +1252,37 @@ class TableDescriptor:
                 purposes.append("Incluye información de inventario disponible")
 
         # Inventario y existencias
-        elif any(k in name_lower for k in ['existencia', 'inventario', 'stock']):
+        elif category == 'inventario':
             purposes.append("Control de inventario y cantidades disponibles por almacén")
             if 'movimiento' in name_lower or 'movto' in name_lower:
                 purposes.append("Registra movimientos de entrada y salida de mercancía")
 
         # Compras
-        elif any(k in name_lower for k in ['compra', 'purchase', 'orden_compra']):
+        elif category == 'compra':
             purposes.append("Gestión de compras y adquisiciones")
             if 'proveedor' in col_names_str:
                 purposes.append("Relaciona órdenes con proveedores")
 
         # Proveedores
-        elif any(k in name_lower for k in ['proveedor', 'vendor', 'supplier']):
+        elif category == 'proveedor':
             purposes.append("Información de proveedores y vendedores")
 
         # Empleados/Personal
-        elif any(k in name_lower for k in ['empleado', 'employee', 'personal', 'vendedor']):
+        elif category == 'empleado':
             purposes.append("Datos de empleados y personal de la empresa")
 
         # Pagos y cobranza
-        elif any(k in name_lower for k in ['pago', 'cobranza', 'abono']):
+        elif category == 'pago':
             purposes.append("Gestión de pagos y cobranzas")
             if 'saldo' in col_names_str:
                 purposes.append("Incluye seguimiento de saldos y deudas")
 
         # Catálogos
-        elif any(k in name_lower for k in ['categoria', 'grupo', 'familia', 'linea', 'marca', 'tipo']):
+        elif category == 'catalogo':
             purposes.append("Catálogo de clasificación y agrupación")
 
         # Configuración
-        elif any(k in name_lower for k in ['config', 'parametro', 'param']):
+        elif category == 'config':
             purposes.append("Configuración y parámetros del sistema")
 
         # Si no detectamos nada específico, análisis genérico
@@ -485,117 +1297,103 @@ class TableDescriptor:
         return ". ".join(purposes)
 
     @staticmethod
-    def _generate_semantic_summary(columns: List[Dict[str, Any]]) -> str:
+    def _generate_semantic_summary(columns: List[Dict[str, Any]]) -> List[str]:
         """
         Generar resumen semántico enfocado en QUÉ información contiene, no cómo se estructura.
         """
-        col_names = [col['name'].lower() for col in columns]
-        col_names_str = ' '.join(col_names)
+        # Clasificar cada columna en una sola pasada (clasificación cacheada por nombre)
+        buckets = {label: [] for label, _, _ in _SEMANTIC_SUMMARY_PATTERNS}
+        for col in columns:
+            for label in _classify_column(_column_name_lower(col)).summary_labels:
+                buckets[label].append(col['name'])
 
         semantic_elements = []
+        for label, _, limit in _SEMANTIC_SUMMARY_PATTERNS:
+            if buckets[label]:
+                semantic_elements.append(f"{label}: {', '.join(buckets[label][:limit])}")
 
-        # Identificadores
-        ids = [col['name'] for col in columns if any(k in col['name'].lower() for k in ['_id', 'codigo', 'cve_', 'clave'])]
-        if ids:
-            semantic_elements.append(f"Identificadores: {', '.join(ids[:5])}")
-
-        # Datos monetarios
-        monetary = [col['name'] for col in columns if any(k in col['name'].lower() for k in ['precio', 'importe', 'costo', 'monto', 'total', 'subtotal'])]
-        if monetary:
-            semantic_elements.append(f"Valores monetarios: {', '.join(monetary[:5])}")
-
-        # Cantidades
-        quantities = [col['name'] for col in columns if any(k in col['name'].lower() for k in ['cantidad', 'unidades', 'qty', 'existencia', 'stock'])]
-        if quantities:
-            semantic_elements.append(f"Cantidades: {', '.join(quantities[:3])}")
-
-        # Fechas
-        dates = [col['name'] for col in columns if any(k in col['name'].lower() for k in ['fecha', 'date', 'timestamp', 'hora'])]
-        if dates:
-            semantic_elements.append(f"Fechas: {', '.join(dates[:3])}")
-
-        # Personas
-        persons = [col['name'] for col in columns if any(k in col['name'].lower() for k in ['cliente', 'proveedor', 'empleado', 'vendedor', 'usuario'])]
-        if persons:
-            semantic_elements.append(f"Personas/Entidades: {', '.join(persons[:3])}")
-
-        # Descripciones/Nombres
-        descriptions = [col['name'] for col in columns if any(k in col['name'].lower() for k in ['nombre', 'descripcion', 'name', 'desc'])]
-        if descriptions:
-            semantic_elements.append(f"Descripciones: {', '.join(descriptions[:3])}")
-
-        return " | ".join(semantic_elements)
+        return semantic_elements
 
     @staticmethod
-    def _describe_sample_data_enriched(columns: List[Dict[str, Any]], sample_data: List[List[Any]]) -> str:
+    def _describe_sample_data_enriched(columns: List[Dict[str, Any]], sample_data: List[List[Any]]) -> List[str]:
         """
         Describir datos de muestra con enfoque en PATRONES y CONTENIDO real, no estadísticas.
         """
         if not sample_data or not columns:
-            return ""
+            return []
 
         descriptions = []
+        row_width = len(sample_data[0])
+
+        # Transponer una sola vez las primeras 8 columnas (filas → columnas);
+        # las filas más cortas se rellenan con None, que se descarta abajo
+        column_values = list(zip_longest(*(row[:8] for row in sample_data[:10])))
 
         for i, col in enumerate(columns[:8]):  # Primeras 8 columnas
-            if i >= len(sample_data[0]):
+            if i >= row_width or i >= len(column_values):
                 continue
 
             col_name = col['name']
-            sample_values = [row[i] for row in sample_data[:10] if i < len(row) and row[i] is not None]
+            data_type = col['data_type']
+            sample_values = [v for v in column_values[i] if v is not None]
 
             if not sample_values:
                 continue
 
             # Para textos, mostrar ejemplos reales
-            if col['data_type'] in ['VARCHAR', 'CHAR']:
-                unique_values = list(set(str(v) for v in sample_values))[:5]
-                if len(unique_values) <= 5 and all(len(str(v)) < 50 for v in unique_values):
+            if data_type in _SAMPLE_TEXT_TYPES:
+                # Primeros 5 valores distintos en orden de aparición (no hace falta ver el resto)
+                unique_set = {}
+                for v in sample_values:
+                    unique_set[str(v)] = None
+                    if len(unique_set) >= 5:
+                        break
+                unique_values = list(unique_set)  # Ya convertidos a str una sola vez
+                if len(unique_values) <= 5 and all(len(v) < 50 for v in unique_values):
                     descriptions.append(f"{col_name}: \"{', '.join(unique_values)}\"")
                 elif unique_values:
                     # Mostrar patrón
-                    first_val = str(unique_values[0])
+                    first_val = unique_values[0]
                     if first_val:
                         descriptions.append(f"{col_name} ejemplo: \"{first_val[:40]}\"")
 
             # Para números, mostrar rango significativo
-            elif col['data_type'] in ['INTEGER', 'SMALLINT', 'BIGINT', 'DECIMAL', 'NUMERIC']:
+            elif data_type in _SAMPLE_NUMERIC_TYPES:
                 try:
-                    numeric_vals = [float(v) for v in sample_values if v is not None]
-                    if numeric_vals:
-                        min_val = min(numeric_vals)
-                        max_val = max(numeric_vals)
-                        avg_val = sum(numeric_vals) / len(numeric_vals)
-                        if min_val == max_val:
-                            descriptions.append(f"{col_name}: {min_val}")
-                        else:
-                            descriptions.append(f"{col_name}: rango {min_val:.2f} a {max_val:.2f}")
-                except:
-                    pass
+                    numeric_vals = np.fromiter((float(v) for v in sample_values),
+                                               dtype=np.float64, count=len(sample_values))
+                    min_val = float(numeric_vals.min())
+                    max_val = float(numeric_vals.max())
+                    if min_val == max_val:
+                        descriptions.append(f"{col_name}: {min_val}")
+                    else:
+                        descriptions.append(f"{col_name}: rango {min_val:.2f} a {max_val:.2f}")
+                except (ValueError, TypeError, OverflowError):
+                    pass  # Valores no numéricos en la muestra
 
             # Para fechas, mostrar rango temporal
-            elif col['data_type'] in ['DATE', 'TIMESTAMP']:
-                try:
-                    date_strs = [str(v) for v in sample_values if v]
-                    if date_strs:
-                        first_date = date_strs[0][:10] if len(date_strs[0]) >= 10 else date_strs[0]
-                        last_date = date_strs[-1][:10] if len(date_strs[-1]) >= 10 else date_strs[-1]
-                        if first_date == last_date:
-                            descriptions.append(f"{col_name}: {first_date}")
-                        else:
-                            descriptions.append(f"{col_name}: desde {first_date}")
-                except:
-                    pass
-
-        return " | ".join(descriptions[:6])  # Máximo 6 descripciones
+            elif data_type in _SAMPLE_DATE_TYPES:
+                # Solo importan el primer y el último valor no vacíos
+                first = next((v for v in sample_values if v), None)
+                if first is not None:
+                    last = next(v for v in reversed(sample_values) if v)
+                    first_date = str(first)[:10]
+                    last_date = str(last)[:10]
+                    if first_date == last_date:
+                        descriptions.append(f"{col_name}: {first_date}")
+                    else:
+                        descriptions.append(f"{col_name}: desde {first_date}")
+
+        return descriptions[:6]  # Máximo 6 descripciones
 
     @staticmethod
-    def _describe_relationships(foreign_keys: List[Dict[str, Any]]) -> str:
+    def _describe_relationships(foreign_keys: List[Dict[str, Any]]) -> List[str]:
         """
         Describir relaciones FK en lenguaje de negocio con DETALLES EXPLÍCITOS.
         CRÍTICO: Esto ayuda a la IA a generar JOINs correctos.
         """
         if not foreign_keys:
-            return ""
+            return []
 
         relationships = []
         for fk in foreign_keys[:8]:  # Aumentado a 8 FKs para más contexto
@@ -635,12 +1433,10 @@ class TableDescriptor:
                 else:
                     relationships.append(f"FK: {col_name} → {ref_table} ({business_name})")
 
-        if relationships:
-            return "Relaciones: " + " | ".join(relationships)
-        return ""
+        return TableDescriptor._prefix_first("Relaciones: ", relationships)
 
     @staticmethod
-    def _describe_key_fields(columns: List[Dict[str, Any]], primary_keys: List[str]) -> str:
+    def _describe_key_fields(columns: List[Dict[str, Any]], primary_keys: List[str]) -> List[str]:
         """
         Describir campos clave con contexto semántico EXPLÍCITO.
         Incluye PK, campos obligatorios, y su propósito.
@@ -686,14 +1482,14 @@ class TableDescriptor:
         # Índices importantes para búsquedas comunes
         search_fields = []
         for col in columns[:15]:  # Primeras 15 columnas
-            col_lower = col['name'].lower()
-            if any(k in col_lower for k in ['codigo', 'cve_', 'folio', 'numero']):
+            col_lower = _column_name_lower(col)
+            if _SEARCH_FIELD_PATTERN.search(col_lower):
                 search_fields.append(col['name'])
 
         if search_fields and len(search_fields) <= 4:
             key_desc.append(f"Búsqueda por: {', '.join(search_fields)}")
 
-        return " | ".join(key_desc)
+        return key_desc
 
     @staticmethod
     def _describe_data_volume(row_count: int) -> str:
@@ -710,17 +1506,17 @@ class TableDescriptor:
             return f"volumen muy alto ({DataFormatter.format_number(row_count)} registros)"
 
     @staticmethod
-    def _generate_query_patterns(table_name: str, columns: List[Dict[str, Any]], primary_keys: List[str]) -> str:
+    def _generate_query_patterns(table_name: str, columns: List[Dict[str, Any]], primary_keys: List[str]) -> List[str]:
         """
         Generar patrones de consulta SQL comunes para esta tabla.
         CRÍTICO: Esto entrena a la IA con ejemplos de cómo consultar cada tabla.
         """
         name_lower = table_name.lower()
-        col_names = {col['name'].lower(): col['name'] for col in columns}
+        col_names = {_column_name_lower(col): col['name'] for col in columns}
         patterns = []
 
         # === PATRONES PARA TABLAS DE VENTAS ===
-        if any(k in name_lower for k in ['doctos_pv', 'ventas', 'factura', 'ticket']):
+        if _QUERY_SALES_TABLE_PATTERN.search(name_lower):
             if 'fecha' in col_names and 'importe' in col_names:
                 patterns.append("Ventas por período: SUM(IMPORTE) WHERE FECHA BETWEEN X AND Y")
             if 'cancelado' in col_names:
@@ -731,7 +1527,7 @@ class TableDescriptor:
                 patterns.append("Por tipo: WHERE TIPO_DOCTO IN ('F', 'T')")
 
         # === PATRONES PARA DETALLE DE VENTAS ===
-        elif '_det' in name_lower and any(k in name_lower for k in ['pv', 'ventas']):
+        elif '_det' in name_lower and _QUERY_SALES_DETAIL_PATTERN.search(name_lower):
             if 'articulo_id' in col_names and 'unidades' in col_names:
                 patterns.append("Productos vendidos: COUNT(DISTINCT ARTICULO_ID)")
                 patterns.append("Unidades totales: SUM(UNIDADES)")
@@ -739,7 +1535,7 @@ class TableDescriptor:
                 patterns.append("JOIN con encabezado: JOIN DOCTOS_PV ON DOCTO_PV_ID")
 
         # === PATRONES PARA ARTÍCULOS/PRODUCTOS ===
-        elif any(k in name_lower for k in ['articulo', 'producto']):
+        elif _QUERY_ARTICLE_TABLE_PATTERN.search(name_lower):
             if 'estatus' in col_names:
                 patterns.append("Activos: WHERE ESTATUS = 'A'")
                 patterns.append("Contar activos: COUNT(*) WHERE ESTATUS = 'A'")
@@ -751,7 +1547,7 @@ class TableDescriptor:
                 patterns.append("Rango de precio: WHERE PRECIO BETWEEN X AND Y")
 
         # === PATRONES PARA CLIENTES ===
-        elif any(k in name_lower for k in ['cliente']):
+        elif 'cliente' in name_lower:
             if 'estatus' in col_names:
                 patterns.append("Clientes activos: WHERE ESTATUS = 'A'")
             if 'nombre' in col_names or 'razon_social' in col_names:
@@ -760,7 +1556,7 @@ class TableDescriptor:
                 patterns.append("Por RFC: WHERE RFC = 'XXXX'")
 
         # === PATRONES PARA INVENTARIO ===
-        elif any(k in name_lower for k in ['inventario', 'existencia', 'saldo']):
+        elif _QUERY_INVENTORY_TABLE_PATTERN.search(name_lower):
             if 'existencia' in col_names:
                 patterns.append("Stock bajo: WHERE EXISTENCIA < MINIMO")
                 patterns.append("Stock total: SUM(EXISTENCIA)")
@@ -781,184 +1577,64 @@ class TableDescriptor:
             pk = primary_keys[0]
             patterns.append(f"Contar registros: COUNT({pk})")
 
-        if patterns:
-            return "Consultas típicas: " + " | ".join(patterns[:5])  # Máximo 5 patrones
-        return ""
+        return TableDescriptor._prefix_first("Consultas típicas: ", patterns[:5])  # Máximo 5 patrones
 
     @staticmethod
-    def _generate_search_terms(table_name: str, columns: List[Dict[str, Any]]) -> str:
+    def _generate_search_terms(table_name: str, columns: List[Dict[str, Any]],
+                               col_names_str: str = None) -> str:
         """
         Generar términos de búsqueda adicionales y sinónimos para mejorar recuperación.
         Estos términos ayudan a que la búsqueda vectorial capture consultas con vocabulario variado.
+
+        El resultado debe ser idéntico entre procesos: la caché de embeddings se
+        indexa por el texto de la descripción, así que no se usan sets (su orden
+        depende de PYTHONHASHSEED) sino un dict como conjunto ordenado.
         """
-        search_terms = set()
+        search_terms: Dict[str, None] = {}
         name_lower = table_name.lower()
-        col_names = [col['name'].lower() for col in columns]
-
-        # Sinónimos por tipo de tabla
-        synonyms_map = {
-            'venta': ['vender', 'vendido', 'transacción', 'ingreso', 'ticket', 'factura', 'cobro'],
-            'cliente': ['comprador', 'consumidor', 'usuario final', 'socio comercial'],
-            'articulo': ['producto', 'mercancía', 'ítem', 'SKU', 'inventario', 'activo', 'activos', 'disponible'],
-            'proveedor': ['vendor', 'supplier', 'abastecedor', 'distribuidor'],
-            'inventario': ['existencia', 'stock', 'almacén', 'bodega', 'disponible'],
-            'compra': ['adquisición', 'orden de compra', 'procurement', 'abastecimiento'],
-            'precio': ['costo', 'importe', 'valor', 'monto', 'tarifa'],
-            'pago': ['abono', 'cobranza', 'liquidación', 'transacción financiera'],
-            'empleado': ['trabajador', 'personal', 'colaborador', 'staff'],
-            'pedido': ['orden', 'solicitud', 'requerimiento', 'order'],
-            'factura': ['invoice', 'comprobante', 'documento fiscal'],
-        }
+        # Los nombres de columna no contienen saltos de línea: unirlos permite
+        # evaluar cada grupo de palabras clave con un solo search()
+        if col_names_str is None:
+            col_names_str = '\n'.join(_column_name_lower(col) for col in columns)
 
         # Agregar sinónimos basados en el nombre de la tabla
-        for key, synonyms in synonyms_map.items():
-            if key in name_lower:
-                search_terms.update(synonyms[:8])  # Aumentado para incluir más términos
+        # (en el orden del diccionario de sinónimos, no en el de aparición en el nombre)
+        name_keys = set(_SEARCH_TERM_KEYS_PATTERN.findall(name_lower))
+        for key, synonyms in _SEARCH_TERM_SYNONYMS.items():
+            if key in name_keys:
+                search_terms.update(dict.fromkeys(synonyms[:8]))  # Aumentado para incluir más términos
 
         # NUEVO: Términos de consulta y agregación para TODAS las tablas
-        search_terms.update(['cuántos', 'cuantos', 'cantidad de', 'total de', 'contar', 'listar', 'mostrar', 'registros', 'elementos'])
+        search_terms.update(dict.fromkeys(['cuántos', 'cuantos', 'cantidad de', 'total de', 'contar', 'listar', 'mostrar', 'registros', 'elementos']))
 
         # NUEVO: Si tiene columna ESTATUS o similar, agregar términos de estado
-        if any('estatus' in col or 'status' in col or 'activo' in col or 'active' in col for col in col_names):
-            search_terms.update(['activo', 'activos', 'vigente', 'vigentes', 'disponible', 'disponibles', 'inactivo', 'inactivos'])
+        if _STATUS_COLUMNS_PATTERN.search(col_names_str):
+            search_terms.update(dict.fromkeys(['activo', 'activos', 'vigente', 'vigentes', 'disponible', 'disponibles', 'inactivo', 'inactivos']))
 
         # Sinónimos por columnas presentes
-        if any('fecha' in col or 'date' in col for col in col_names):
-            search_terms.update(['temporal', 'histórico', 'cronológico'])
+        if _DATE_COLUMNS_PATTERN.search(col_names_str):
+            search_terms.update(dict.fromkeys(['temporal', 'histórico', 'cronológico']))
 
-        if any('importe' in col or 'precio' in col or 'monto' in col for col in col_names):
-            search_terms.update(['financiero', 'monetario', 'económico'])
+        if _MONEY_COLUMNS_PATTERN.search(col_names_str):
+            search_terms.update(dict.fromkeys(['financiero', 'monetario', 'económico']))
 
-        if any('cantidad' in col or 'unidades' in col for col in col_names):
-            search_terms.update(['volumen', 'conteo', 'suma', 'total'])
+        if _QUANTITY_COLUMNS_PATTERN.search(col_names_str):
+            search_terms.update(dict.fromkeys(['volumen', 'conteo', 'suma', 'total']))
 
         # Términos de análisis comunes
         if 'det' in name_lower or 'detalle' in name_lower:
-            search_terms.update(['línea', 'ítem', 'movimiento individual', 'partida'])
+            search_terms.update(dict.fromkeys(['línea', 'ítem', 'movimiento individual', 'partida']))
 
-        if any(k in name_lower for k in ['encab', 'header', 'docto']):
-            search_terms.update(['documento', 'cabecera', 'resumen'])
+        if _HEADER_NAME_PATTERN.search(name_lower):
+            search_terms.update(dict.fromkeys(['documento', 'cabecera', 'resumen']))
 
         # Limitar a los términos más relevantes (aumentado para incluir términos de consulta)
-        return ', '.join(list(search_terms)[:25])
+        return ', '.join(islice(search_terms, 25))
 
     @staticmethod
     def _infer_table_purpose(table_name: str) -> Optional[str]:
         """Inferir el propósito de una tabla por su nombre."""
-        name_lower = table_name.lower()
-        
-        purpose_keywords = {
-            # Comercial y ventas
-            'ventas': 'ventas y transacciones comerciales',
-            'venta': 'ventas y transacciones comerciales',
-            'facturas': 'facturación',
-            'factura': 'facturación',
-            'pedidos': 'gestión de pedidos',
-            'pedido': 'gestión de pedidos',
-            'cotizaciones': 'cotizaciones y presupuestos',
-            'cotizacion': 'cotizaciones y presupuestos',
-            'remisiones': 'remisiones y entregas',
-            'remision': 'remisiones y entregas',
-            
-            # Clientes y proveedores
-            'clientes': 'información de clientes',
-            'cliente': 'información de clientes',
-            'proveedores': 'información de proveedores',
-            'proveedor': 'información de proveedores',
-            'contactos': 'contactos y relaciones',
-            'contacto': 'contactos y relaciones',
-            
-            # Productos e inventario
-            'productos': 'catálogo de productos y artículos',
-            'producto': 'catálogo de productos y artículos',
-            'articulos': 'catálogo de productos y artículos',
-            'articulo': 'catálogo de productos y artículos',
-            'items': 'catálogo de productos y artículos',
-            'inventario': 'control de inventarios y existencias',
-            'existencias': 'control de inventarios y existencias',
-            'stock': 'control de inventarios y existencias',
-            'almacen': 'gestión de almacenes',
-            'almacenes': 'gestión de almacenes',
-            'bodega': 'gestión de almacenes',
-            'bodegas': 'gestión de almacenes',
-            'movimientos': 'movimientos de inventario',
-            'movimiento': 'movimientos de inventario',
-            
-            # Personal
-            'empleados': 'información de empleados',
-            'empleado': 'información de empleados',
-            'personal': 'información de empleados',
-            'usuarios': 'gestión de usuarios',
-            'usuario': 'gestión de usuarios',
-            
-            # Financiero
-            'pagos': 'gestión de pagos',
-            'pago': 'gestión de pagos',
-            'cobranza': 'cobranza y cuentas por cobrar',
-            'cobranzas': 'cobranza y cuentas por cobrar',
-            'cuentas': 'cuentas y contabilidad',
-            'cuenta': 'cuentas y contabilidad',
-            'movtos': 'movimientos financieros',
-            'bancos': 'movimientos bancarios',
-            'banco': 'movimientos bancarios',
-            
-            # Catálogos
-            'categorias': 'categorización y clasificación',
-            'categoria': 'categorización y clasificación',
-            'grupos': 'agrupación y clasificación',
-            'grupo': 'agrupación y clasificación',
-            'tipos': 'tipos y clasificaciones',
-            'tipo': 'tipos y clasificaciones',
-            'familias': 'familias de productos',
-            'familia': 'familias de productos',
-            'lineas': 'líneas de productos',
-            'linea': 'líneas de productos',
-            'marcas': 'marcas de productos',
-            'marca': 'marcas de productos',
-            
-            # Ubicación
-            'zonas': 'zonas geográficas',
-            'zona': 'zonas geográficas',
-            'rutas': 'rutas de distribución',
-            'ruta': 'rutas de distribución',
-            'sucursales': 'sucursales y ubicaciones',
-            'sucursal': 'sucursales y ubicaciones',
-            
-            # Sistema
-            'logs': 'registro de eventos y auditoría',
-            'log': 'registro de eventos y auditoría',
-            'configuracion': 'configuración del sistema',
-            'config': 'configuración del sistema',
-            'parametros': 'parámetros del sistema',
-            'parametro': 'parámetros del sistema',
-            'reportes': 'generación de reportes',
-            'reporte': 'generación de reportes',
-            'audit': 'auditoría del sistema',
-            'auditoria': 'auditoría del sistema',
-            'temp': 'datos temporales',
-            'temporal': 'datos temporales',
-            'backup': 'respaldo de datos',
-            'respaldo': 'respaldo de datos',
-            
-            # Documentos
-            'documentos': 'documentos y archivos',
-            'documento': 'documentos y archivos',
-            'notas': 'notas y comentarios',
-            'nota': 'notas y comentarios',
-            
-            # Procesos
-            'compras': 'compras y adquisiciones',
-            'compra': 'compras y adquisiciones',
-            'produccion': 'producción y manufactura',
-            'ordenes': 'órdenes de trabajo',
-            'orden': 'órdenes de trabajo',
-        }
-        
-        for keyword, purpose in purpose_keywords.items():
-            if keyword in name_lower:
-                return purpose
-        
-        return None
+        return _TABLE_PURPOSE_MATCHER.match(table_name.lower())
     
     @staticmethod
     def _identify_key_columns(columns: List[Dict[str, Any]]) -> List[str]:
@@ -966,24 +1642,9 @@ class TableDescriptor:
         key_columns = []
         
         for col in columns[:10]:  # Solo primeras 10 columnas
-            col_name = col['name'].lower()
-            
-            # IDs y claves
-            if any(keyword in col_name for keyword in ['id', 'key', 'codigo', 'code']):
-                key_columns.append(col['name'])
-            
-            # Nombres y descripciones
-            elif any(keyword in col_name for keyword in ['nombre', 'name', 'descripcion', 'desc']):
-                key_columns.append(col['name'])
-            
-            # Fechas importantes
-            elif any(keyword in col_name for keyword in ['fecha', 'date', 'time', 'created', 'updated']):
+            if _classify_column(_column_name_lower(col)).is_key:
                 key_columns.append(col['name'])
-            
-            # Montos y cantidades
-            elif any(keyword in col_name for keyword in ['monto', 'amount', 'cantidad', 'qty', 'precio', 'price']):
-                key_columns.append(col['name'])
-        
+
         return key_columns[:5]  # Máximo 5 columnas clave
     
     @staticmethod
@@ -991,26 +1652,8 @@ class TableDescriptor:
         """Identificar tipos semánticos de campos para mejorar búsqueda RAG."""
         semantic_types = set()
         
-        field_semantics = {
-            'identificación': ['id', 'codigo', 'code', 'clave', 'key', 'folio', 'numero'],
-            'nombres y descripciones': ['nombre', 'name', 'descripcion', 'desc', 'titulo', 'title'],
-            'fechas y tiempos': ['fecha', 'date', 'time', 'hora', 'timestamp', 'created', 'updated', 'modified'],
-            'importes y precios': ['precio', 'price', 'monto', 'amount', 'importe', 'costo', 'cost', 'total', 'subtotal'],
-            'cantidades': ['cantidad', 'qty', 'quantity', 'stock', 'existencia', 'unidades'],
-            'estados': ['status', 'estado', 'activo', 'active', 'vigente', 'eliminado', 'deleted'],
-            'personas': ['cliente', 'customer', 'proveedor', 'vendor', 'empleado', 'employee', 'usuario', 'user'],
-            'ubicaciones': ['direccion', 'address', 'ciudad', 'city', 'pais', 'country', 'zona', 'region', 'almacen', 'warehouse'],
-            'contacto': ['email', 'mail', 'telefono', 'phone', 'celular', 'mobile', 'contacto', 'contact'],
-            'financiero': ['pago', 'payment', 'saldo', 'balance', 'credito', 'credit', 'deuda', 'debt'],
-            'impuestos': ['iva', 'tax', 'impuesto', 'ieps', 'retencion'],
-            'documentos': ['factura', 'invoice', 'pedido', 'order', 'nota', 'recibo', 'receipt', 'documento', 'document'],
-        }
-        
         for col in columns:
-            col_name = col['name'].lower()
-            for semantic_category, keywords in field_semantics.items():
-                if any(keyword in col_name for keyword in keywords):
-                    semantic_types.add(semantic_category)
+            semantic_types.update(_classify_column(_column_name_lower(col)).semantic_types)
         
         return sorted(list(semantic_types))
     
@@ -1018,111 +1661,250 @@ class TableDescriptor:
     def _describe_sample_data(columns: List[Dict[str, Any]], sample_data: List[List[Any]]) -> str:
         """Describir datos de muestra (método antiguo, mantenido por compatibilidad)."""
         # Redirigir al nuevo método enriquecido
-        return TableDescriptor._describe_sample_data_enriched(columns, sample_data)
+        return " | ".join(TableDescriptor._describe_sample_data_enriched(columns, sample_data))
 
     @staticmethod
-    def _analyze_data_patterns(columns: List[Dict[str, Any]], sample_data: List[List[Any]]) -> str:
+    def _analyze_data_patterns(columns: List[Dict[str, Any]], sample_data: List[List[Any]],
+                               col_names_lower: List[str] = None) -> List[str]:
         """
         Analizar patrones avanzados en datos para detectar características especiales.
         Ejemplos: tablas transaccionales vs maestros, datos históricos vs actuales, etc.
         """
         if not sample_data or not columns:
-            return ""
+            return []
 
         patterns = []
+        if col_names_lower is None:
+            col_names_lower = [_column_name_lower(col) for col in columns]
 
-        # Analizar distribución temporal
         date_cols = [(i, col) for i, col in enumerate(columns) if 'DATE' in col.get('data_type', '') or 'TIMESTAMP' in col.get('data_type', '')]
+
+        # Transponer una sola vez (filas → columnas) solo hasta la última columna que se revisa:
+        # 2 de fecha, 5 candidatas a ID y 3 a nombre. Las filas cortas se rellenan con None.
+        width = max([5] + [col_idx + 1 for col_idx, _ in date_cols[:2]])
+        column_values = list(zip_longest(*(row[:width] for row in sample_data)))
+
+        def sample_column(col_idx: int) -> Tuple[Any, ...]:
+            return column_values[col_idx] if col_idx < len(column_values) else ()
+
+        # Analizar distribución temporal
         if date_cols:
             for col_idx, col in date_cols[:2]:  # Primeras 2 columnas de fecha
-                try:
-                    date_values = [row[col_idx] for row in sample_data if col_idx < len(row) and row[col_idx]]
-                    if date_values:
-                        date_strs = [str(d) for d in date_values]
-                        first = date_strs[0][:10] if len(date_strs[0]) >= 10 else date_strs[0]
-                        last = date_strs[-1][:10] if len(date_strs[-1]) >= 10 else date_strs[-1]
-
-                        # Detectar si son fechas recientes (datos operacionales)
-                        if '2024' in last or '2025' in last:
-                            patterns.append("datos operacionales actuales")
-                        elif first != last:
-                            patterns.append(f"datos desde {first[:4]}")
-                except:
-                    pass
+                # Solo importan el primer y el último valor no vacíos
+                values = sample_column(col_idx)
+                first_value = next((v for v in values if v), None)
+                if first_value is not None:
+                    first = str(first_value)[:10]
+                    last = str(next(v for v in reversed(values) if v))[:10]
+
+                    # Detectar si son fechas recientes (datos operacionales)
+                    if '2024' in last or '2025' in last:
+                        patterns.append("datos operacionales actuales")
+                    elif first != last:
+                        patterns.append(f"datos desde {first[:4]}")
 
         # Detectar si es tabla transaccional (tiene ID secuencial + fecha)
         has_sequential_id = False
-        for i, col in enumerate(columns[:5]):
-            if any(k in col['name'].lower() for k in ['_id', 'id', 'folio', 'numero']):
+        for i, name_lower in enumerate(col_names_lower[:5]):
+            if _classify_column(name_lower).is_sequential_id:
                 try:
-                    ids = [row[i] for row in sample_data[:10] if i < len(row) and row[i] is not None]
+                    ids = [v for v in sample_column(i)[:10] if v is not None]
                     if len(ids) >= 3:
                         numeric_ids = [int(v) for v in ids if str(v).isdigit()]
                         if len(numeric_ids) >= 3:
-                            # Verificar si son secuenciales
-                            diffs = [numeric_ids[i+1] - numeric_ids[i] for i in range(len(numeric_ids)-1)]
-                            avg_diff = sum(diffs) / len(diffs) if diffs else 0
+                            # Verificar si son secuenciales: el promedio de las diferencias
+                            # consecutivas se reduce a (último - primero) / (n - 1)
+                            avg_diff = (numeric_ids[-1] - numeric_ids[0]) / (len(numeric_ids) - 1)
                             if 0 < avg_diff < 100:  # Diferencias pequeñas = secuencial
                                 has_sequential_id = True
                                 patterns.append("registros secuenciales")
                                 break
-                except:
-                    pass
+                except ValueError:
+                    pass  # Dígitos Unicode que isdigit() acepta pero int() no
 
         # Detectar si es catálogo (pocos registros únicos en columnas clave)
         is_catalog = False
-        for i, col in enumerate(columns[:3]):
-            if 'nombre' in col['name'].lower() or 'descripcion' in col['name'].lower():
-                try:
-                    values = [row[i] for row in sample_data if i < len(row) and row[i]]
-                    unique_count = len(set(str(v) for v in values))
-                    if unique_count == len(values) and len(values) < 20:
-                        is_catalog = True
-                        patterns.append("catálogo maestro")
-                        break
-                except:
-                    pass
+        for i, name_lower in enumerate(col_names_lower[:3]):
+            if 'nombre' in name_lower or 'descripcion' in name_lower:
+                values = [v for v in sample_column(i) if v]
+                if len(values) < 20 and len({str(v) for v in values}) == len(values):
+                    is_catalog = True
+                    patterns.append("catálogo maestro")
+                    break
 
         # Detectar campos monetarios significativos
-        monetary_cols = [col for col in columns if any(k in col['name'].lower() for k in ['precio', 'importe', 'total', 'costo', 'monto'])]
-        if monetary_cols and len(monetary_cols) >= 2:
+        monetary_count = sum(1 for name in col_names_lower if _classify_column(name).is_monetary)
+        if monetary_count >= 2:
             patterns.append("gestión financiera")
 
-        # Detectar si tiene campos de auditoría
-        audit_fields = [col for col in columns if any(k in col['name'].lower() for k in ['creado', 'modificado', 'usuario', 'created', 'updated'])]
-        if audit_fields:
+        # Detectar si tiene campos de auditoría (basta con el primero)
+        if any(_classify_column(name).is_audit for name in col_names_lower):
             patterns.append("con auditoría")
 
-        return " | ".join(patterns) if patterns else ""
+        return patterns
+
+
+def _aligned_empty(rows: int, dim: int, alignment: int = 64) -> np.ndarray:
+    """Reservar matriz float32 (rows, dim) cuyo inicio queda alineado a `alignment` bytes."""
+    nbytes = rows * dim * 4
+    raw = np.empty(nbytes + alignment, dtype=np.uint8)
+    offset = (-raw.ctypes.data) % alignment
+    return raw[offset:offset + nbytes].view(np.float32).reshape(rows, dim)
+
+
+class TableEmbeddingStore:
+    """
+    Embeddings de tablas en formato struct-of-arrays.
+
+    Una matriz float32 contigua (N, D) con filas L2-normalizadas, las listas
+    paralelas de nombres y metadatos, y un índice nombre → fila. La capacidad
+    crece al doble, así que agregar tablas no vuelve a apilar toda la matriz.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIMENSIONS, capacity: int = 0):
+        self.dim = dim
+        self.names: List[str] = []
+        self.meta: List[Any] = []  # Metadatos por fila (lo que devuelve la búsqueda)
+        self.index: Dict[str, int] = {}
+        self._vectors = _aligned_empty(capacity, dim)
+        self._active = np.empty(capacity, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Vista (N, D) de las filas ocupadas."""
+        return self._vectors[:len(self.names)]
+
+    @property
+    def active_mask(self) -> np.ndarray:
+        """Vista (N,) con True para tablas activas."""
+        return self._active[:len(self.names)]
+
+    def clear(self):
+        """Vaciar el almacén conservando la memoria reservada."""
+        self.names = []
+        self.meta = []
+        self.index = {}
+
+    def load(self, names: List[str], vectors: np.ndarray, is_active: Any, meta: List[Any]):
+        """
+        Adoptar una matriz ya normalizada (p. ej. np.load con mmap_mode='r') sin copiarla.
+
+        La matriz queda de solo lectura; la primera escritura la copia a un buffer propio.
+        """
+        self.names = list(names)
+        self.meta = list(meta)
+        self.index = {name: row for row, name in enumerate(self.names)}
+        self._vectors = vectors
+        self._active = np.asarray(is_active, dtype=bool)
+
+    def reserve(self, capacity: int):
+        """Asegurar capacidad para `capacity` filas (crecimiento al doble)."""
+        current = len(self._vectors)
+        if capacity <= current and self._vectors.flags.writeable:
+            return
+        new_capacity = max(capacity, current * 2, 16) if capacity > current else current
+        vectors = _aligned_empty(new_capacity, self.dim)
+        active = np.empty(new_capacity, dtype=bool)
+        n = len(self.names)
+        vectors[:n] = self._vectors[:n]
+        active[:n] = self._active[:n]
+        self._vectors = vectors
+        self._active = active
+
+    def upsert_many(self, names: List[str], embeddings: Any, is_active: List[bool],
+                    meta: List[Any] = None):
+        """Agregar o reemplazar filas; cada fila se normaliza en su lugar."""
+        if not names:
+            return
+        self.reserve(len(self.names) + len(names))
+        if meta is None:
+            meta = [None] * len(names)
+
+        rows = np.empty(len(names), dtype=np.intp)
+        for i, name in enumerate(names):
+            row = self.index.get(name)
+            if row is None:
+                row = len(self.names)
+                self.index[name] = row
+                self.names.append(name)
+                self.meta.append(meta[i])
+            else:
+                self.meta[row] = meta[i]
+            rows[i] = row
+
+        block = np.asarray(embeddings, dtype=np.float32).reshape(len(names), self.dim)
+        block = block / (np.linalg.norm(block, axis=1, keepdims=True) + 1e-10)
+        self._vectors[rows] = block
+        self._active[rows] = np.asarray(is_active, dtype=bool)
+
+    def remove_many(self, names: List[str]):
+        """Quitar filas; las restantes conservan su orden y la matriz se compacta."""
+        n = len(self.names)
+        keep = np.ones(n, dtype=bool)
+        keep[[self.index[name] for name in names if name in self.index]] = False
+        if keep.all():
+            return
+        kept_rows = np.flatnonzero(keep)
+
+        vectors = _aligned_empty(len(kept_rows), self.dim)
+        vectors[:] = self._vectors[:n][kept_rows]
+        self._active = self._active[:n][kept_rows]
+        self._vectors = vectors
+        self.names = [self.names[row] for row in kept_rows]
+        self.meta = [self.meta[row] for row in kept_rows]
+        self.index = {name: row for row, name in enumerate(self.names)}
 
 
 class VectorStore:
-    """Almacén vectorial simple usando JSON + numpy (sin ChromaDB)."""
+    """Almacén vectorial simple usando numpy (.npy) + metadatos JSON (sin ChromaDB)."""
 
     def __init__(self):
-        self.embeddings_data = {}  # {table_name: {'embedding': [...], 'metadata': {...}}}
+        self.embeddings_data = {}  # {table_name: {'description': ..., 'row_count': ..., ...}} (sin vectores)
+        # Matriz float32 (N, D) normalizada + metadatos por fila en el mismo orden
+        self.vectors_path = os.path.join(config.rag.vector_db_path, "embeddings.npy")
+        self.metadata_path = os.path.join(config.rag.vector_db_path, "metadata.json")
+        # Índice FAISS aproximado (IVF/HNSW) persistido para no reconstruirlo en cada arranque
+        self.index_path = os.path.join(config.rag.vector_db_path, "faiss.index")
+        # Formato anterior (JSON con listas de floats); solo se lee para migrar
         self.storage_path = os.path.join(config.rag.vector_db_path, "embeddings.json")
         self._initialized = False
 
+        # Matriz (N, D) float32 con embeddings L2-normalizados + nombres e índice nombre → fila
+        self._store = TableEmbeddingStore()
+        # Copia cuantizada (fp16/int8) usada para el escaneo; la del store queda para re-ranking fp32
+        self._scan_matrix = self._store.vectors
+        self._scan_scales = None  # Escala por fila cuando _scan_matrix es int8
+        self._scan_quantized = False
+        self._index = None  # Índice FAISS opcional sobre la matriz del store
+        self._scan_dirty = True  # Matriz de escaneo / índice FAISS desactualizados
+        # Serializa escrituras (recarga del esquema en segundo plano) con las búsquedas
+        self._lock = threading.RLock()
+
     def initialize(self):
-        """Inicializar almacén vectorial desde archivo JSON."""
+        """Inicializar almacén vectorial desde embeddings.npy + metadata.json."""
         if self._initialized:
             return
 
         try:
-            logger.info("🔧 Inicializando almacén vectorial simple (JSON + numpy)...")
+            logger.info("🔧 Inicializando almacén vectorial simple (numpy + JSON)...")
 
             # Crear directorio si no existe
             os.makedirs(config.rag.vector_db_path, exist_ok=True)
 
             # Cargar embeddings existentes si hay
-            if os.path.exists(self.storage_path):
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    self.embeddings_data = json.load(f)
+            if os.path.exists(self.vectors_path) and os.path.exists(self.metadata_path):
+                self._load_binary()
                 logger.info(f"✓ Cargados {len(self.embeddings_data)} embeddings desde archivo")
+            elif os.path.exists(self.storage_path):
+                self._load_legacy_json()
+                logger.info(f"✓ Migrados {len(self.embeddings_data)} embeddings de JSON a formato binario")
             else:
                 logger.info("✓ Inicializando almacén vectorial vacío")
 
+            self._scan_dirty = True
             self._initialized = True
             logger.info("✅ Almacén vectorial inicializado correctamente")
 
@@ -1130,37 +1912,141 @@ class VectorStore:
             logger.error(f"❌ Error inicializando almacén vectorial: {e}")
             # No fallar - continuar con diccionario vacío
             self.embeddings_data = {}
+            self._store = TableEmbeddingStore()
             self._initialized = True
 
+    def _load_binary(self):
+        """Cargar la matriz con mmap (sin parsear floats) y los metadatos por fila."""
+        vectors = np.load(self.vectors_path, mmap_mode='r')
+        records = _load_json_file(self.metadata_path)
+        if len(records) != len(vectors):
+            raise ValueError(f"{self.metadata_path} tiene {len(records)} tablas y la matriz {len(vectors)} filas")
+
+        names = [record.pop('table_name') for record in records]
+        self.embeddings_data = dict(zip(names, records))
+        self._store.load(
+            names,
+            vectors,
+            [record.get('is_active', True) for record in records],
+            [self._result_metadata(record) for record in records]
+        )
+        self._index = self._load_index_file(len(vectors))
+
+    def _load_legacy_json(self):
+        """Leer el embeddings.json anterior y reescribirlo en formato .npy + metadata.json."""
+        data = _load_json_file(self.storage_path)
+        names = list(data.keys())
+
+        self._store.clear()
+        self._store.upsert_many(
+            names,
+            [data[name]['embedding'] for name in names],
+            [data[name].get('is_active', True) for name in names],
+            [self._result_metadata(data[name]) for name in names]
+        )
+        self.embeddings_data = {
+            name: {key: value for key, value in data[name].items() if key != 'embedding'}
+            for name in names
+        }
+        self._save()
+
+    def _save(self):
+        """
+        Escribir la matriz normalizada (.npy) y los metadatos sin vectores (JSON).
+
+        Cada archivo se escribe a un .tmp y se reemplaza con os.replace, así una
+        interrupción a mitad de escritura no deja un archivo truncado.
+        """
+        vectors_tmp = self.vectors_path + '.tmp'
+        with open(vectors_tmp, 'wb') as f:
+            np.save(f, self._store.vectors)
+
+        records = [{'table_name': name, **self.embeddings_data[name]} for name in self._store.names]
+        metadata_tmp = self.metadata_path + '.tmp'
+        _dump_json_file(metadata_tmp, records)
+
+        index_tmp = None
+        if self._index is not None and self._faiss_index_type(len(self._store)) != 'flat':
+            index_tmp = self.index_path + '.tmp'
+            faiss.write_index(self._index, index_tmp)
+
+        os.replace(vectors_tmp, self.vectors_path)
+        os.replace(metadata_tmp, self.metadata_path)
+        if index_tmp is not None:
+            os.replace(index_tmp, self.index_path)
+        elif os.path.exists(self.index_path):
+            # El índice guardado ya no corresponde a la matriz (p. ej. se pasó a IndexFlatIP)
+            os.remove(self.index_path)
+
     def add_table_embeddings(self, table_embeddings: Dict[str, Dict[str, Any]]):
         """Agregar embeddings de tablas al almacén."""
         if not self._initialized:
             self.initialize()
 
-        try:
-            logger.info(f"💾 Guardando {len(table_embeddings)} embeddings...")
-
-            # Agregar/actualizar embeddings
-            for table_name, data in table_embeddings.items():
-                self.embeddings_data[table_name] = {
-                    'embedding': data['embedding'],
-                    'description': data['description'],
-                    'row_count': data.get('row_count', 0),
-                    'is_active': data.get('is_active', True),
-                    'column_count': data.get('column_count', 0),
-                    'has_foreign_keys': data.get('has_foreign_keys', False),
-                    'created_at': datetime.now().isoformat()
-                }
+        with self._lock:
+            try:
+                logger.info(f"💾 Guardando {len(table_embeddings)} embeddings...")
 
-            # Guardar a archivo JSON
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(self.embeddings_data, f, ensure_ascii=False, indent=2)
+                # Agregar/actualizar metadatos (los vectores van solo al store)
+                created_at = datetime.now().isoformat()
+                for table_name, data in table_embeddings.items():
+                    self.embeddings_data[table_name] = {
+                        'description': data['description'],
+                        'row_count': data.get('row_count', 0),
+                        'is_active': data.get('is_active', True),
+                        'column_count': data.get('column_count', 0),
+                        'has_foreign_keys': data.get('has_foreign_keys', False),
+                        'fingerprint': data.get('fingerprint'),
+                        'created_at': created_at
+                    }
+                # Actualizar solo las filas nuevas/modificadas del store
+                names = list(table_embeddings)
+                self._store.upsert_many(
+                    names,
+                    [data['embedding'] for data in table_embeddings.values()],
+                    [data.get('is_active', True) for data in table_embeddings.values()],
+                    [self._result_metadata(self.embeddings_data[name]) for name in names]
+                )
+                # Regenerar ya el escaneo: suelta las referencias al .npy mapeado antes de reescribirlo
+                self._refresh_scan_index()
 
-            logger.info(f"✅ {len(table_embeddings)} embeddings guardados correctamente")
+                # Guardar matriz + metadatos
+                self._save()
 
-        except Exception as e:
-            logger.error(f"❌ Error guardando embeddings: {e}")
-            # No fallar - continuar en memoria
+                logger.info(f"✅ {len(table_embeddings)} embeddings guardados correctamente")
+
+            except Exception as e:
+                logger.error(f"❌ Error guardando embeddings: {e}")
+                # No fallar - continuar en memoria
+
+    def remove_tables(self, table_names: List[str]):
+        """Quitar del almacén tablas que ya no existen en el esquema."""
+        if not self._initialized:
+            self.initialize()
+
+        with self._lock:
+            try:
+                removed = [name for name in table_names if self.embeddings_data.pop(name, None) is not None]
+                if not removed:
+                    return
+                self._store.remove_many(removed)
+                self._refresh_scan_index()
+                self._save()
+                logger.info(f"🗑️ {len(removed)} tablas eliminadas del almacén vectorial")
+            except Exception as e:
+                logger.error(f"❌ Error eliminando embeddings: {e}")
+
+    def get_stored_embedding(self, table_name: str) -> Optional[Tuple[Dict[str, Any], np.ndarray]]:
+        """Metadatos guardados y copia del embedding (normalizado) de una tabla, o None."""
+        if not self._initialized:
+            self.initialize()
+
+        with self._lock:
+            row = self._store.index.get(table_name)
+            data = self.embeddings_data.get(table_name)
+            if row is None or data is None:
+                return None
+            return data, np.array(self._store.vectors[row])
 
     def search_similar_tables(self, query_embedding: List[float],
                             top_k: int = None,
@@ -1172,63 +2058,237 @@ class VectorStore:
         if top_k is None:
             top_k = config.rag.top_k_tables
 
-        try:
-            if not self.embeddings_data:
-                logger.warning("⚠️ No hay embeddings disponibles para búsqueda")
+        with self._lock:
+            try:
+                if not self.embeddings_data:
+                    logger.warning("⚠️ No hay embeddings disponibles para búsqueda")
+                    return []
+
+                if self._scan_dirty:
+                    # Un índice leído de disco al inicializar ya corresponde a la matriz cargada
+                    self._refresh_scan_index(rebuild_index=self._index is None)
+
+                # Normalizar query una sola vez: cosine similarity = producto punto de vectores unitarios
+                query_vec = np.asarray(query_embedding, dtype=np.float32)
+                query_norm = query_vec / (np.linalg.norm(query_vec) + 1e-10)
+
+                names = self._store.names
+                meta = self._store.meta
+                rows, row_scores, total_candidates = self._search_top_rows(query_norm, top_k, filter_active)
+
+                # Filtrar por threshold (rows ya viene ordenado descendente)
+                similar_tables = []
+                for row, similarity in zip(rows, row_scores):
+                    similarity = float(similarity)
+                    if similarity < config.rag.similarity_threshold:
+                        break
+
+                    description, metadata = meta[row]
+                    similar_tables.append({
+                        'table_name': names[row],
+                        'description': description,
+                        'similarity': similarity,
+                        'metadata': dict(metadata)
+                    })
+
+                logger.info(f"🔍 Encontradas {len(similar_tables)} de {total_candidates} tablas que superan threshold {config.rag.similarity_threshold}")
+
+                for table in similar_tables[:5]:  # Log top 5
+                    logger.debug(f"  ✓ {table['table_name']}: {table['similarity']:.3f}")
+
+                return similar_tables
+
+            except Exception as e:
+                logger.error(f"❌ Error buscando tablas similares: {e}")
                 return []
 
-            # Convertir query embedding a numpy array
-            query_vec = np.array(query_embedding)
+    @staticmethod
+    def _result_metadata(data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Precalcular (descripción, metadatos) que devuelve la búsqueda para una tabla."""
+        return data['description'], {
+            'row_count': data.get('row_count', 0),
+            'is_active': data.get('is_active', True),
+            'column_count': data.get('column_count', 0),
+            'has_foreign_keys': data.get('has_foreign_keys', False)
+        }
 
-            # Calcular similitud coseno con todas las tablas
-            similarities = []
+    def _search_top_rows(self, query_norm: np.ndarray, top_k: int,
+                         filter_active: bool) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Obtener las filas más similares a la query (ya normalizada).
 
-            for table_name, data in self.embeddings_data.items():
-                # Filtrar por activas si se solicita
-                if filter_active and not data.get('is_active', True):
-                    continue
+        Returns:
+            (filas ordenadas por similitud descendente, similitudes, total de tablas candidatas)
+        """
+        active_mask = self._store.active_mask
+        total_candidates = int(active_mask.sum()) if filter_active else len(active_mask)
+
+        if self._index is not None:
+            # Pedir suficientes vecinos para que sobrevivan top_k tras descartar inactivas
+            k_search = top_k + (len(active_mask) - total_candidates if filter_active else 0)
+            if not isinstance(self._index, faiss.IndexFlat):
+                # Índices aproximados (IVF/HNSW/SQ8): sobremuestrear para compensar el recall
+                k_search = max(k_search, top_k * 3)
+            k_search = min(k_search, len(active_mask))
+            distances, ids = self._index.search(query_norm.reshape(1, -1), k_search)
+            keep = ids[0] >= 0
+            if filter_active:
+                keep &= active_mask[np.maximum(ids[0], 0)]
+            ids, distances = ids[0][keep], distances[0][keep]
+            if isinstance(self._index, faiss.IndexScalarQuantizer):
+                # Similitud int8 aproximada: re-ordenar los candidatos con la matriz fp32
+                distances = self._store.vectors[ids] @ query_norm
+                order = np.argsort(-distances, kind='stable')
+                ids, distances = ids[order], distances[order]
+            return ids[:top_k], distances[:top_k], total_candidates
+
+        # Similitud coseno contra todas las tablas en una sola multiplicación matriz-vector
+        quantized = self._scan_quantized
+        scores = self._scan_scores(query_norm)
+
+        keep = active_mask if filter_active else np.ones(len(active_mask), dtype=bool)
+        if not quantized:
+            # Descartar de entrada las que no alcanzan el threshold (con fp32 la similitud es exacta)
+            keep = keep & (scores >= config.rag.similarity_threshold)
+        candidates = np.flatnonzero(keep)
+        candidate_scores = scores[candidates]
+
+        # Con matriz cuantizada se preseleccionan 4x candidatos y se re-ordenan en fp32
+        k = min(top_k * 4 if quantized else top_k, len(candidates))
+
+        # Selección parcial O(N) de las top_k en lugar de ordenar todas
+        if 0 < k < len(candidates):
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
 
-                # Calcular cosine similarity
-                table_vec = np.array(data['embedding'])
+        if quantized:
+            candidate_scores = candidate_scores.copy()
+            candidate_scores[top] = self._store.vectors[candidates[top]] @ query_norm
 
-                # Normalizar vectores
-                query_norm = query_vec / (np.linalg.norm(query_vec) + 1e-10)
-                table_norm = table_vec / (np.linalg.norm(table_vec) + 1e-10)
+        top = top[np.argsort(-candidate_scores[top], kind='stable')][:top_k]
 
-                # Cosine similarity = dot product de vectores normalizados
-                similarity = float(np.dot(query_norm, table_norm))
+        return candidates[top], candidate_scores[top], total_candidates
 
-                similarities.append({
-                    'table_name': table_name,
-                    'description': data['description'],
-                    'similarity': similarity,
-                    'metadata': {
-                        'row_count': data.get('row_count', 0),
-                        'is_active': data.get('is_active', True),
-                        'column_count': data.get('column_count', 0),
-                        'has_foreign_keys': data.get('has_foreign_keys', False)
-                    }
-                })
+    def _scan_scores(self, query_norm: np.ndarray) -> np.ndarray:
+        """Similitud (aproximada si la matriz de escaneo está cuantizada) contra todas las filas."""
+        scan = self._scan_matrix
+        if scan.dtype == np.float32:
+            return scan @ query_norm
+
+        # numpy no tiene BLAS para fp16/int8: subir a fp32 por bloques pequeños (caben en caché)
+        # y multiplicar con BLAS, sin materializar una copia fp32 de toda la matriz
+        scores = np.empty(len(scan), dtype=np.float32)
+        for start in range(0, len(scan), _SCAN_BLOCK_ROWS):
+            end = start + _SCAN_BLOCK_ROWS
+            np.dot(scan[start:end].astype(np.float32), query_norm, out=scores[start:end])
+
+        if scan.dtype == np.int8:
+            # v ≈ q_int8 * scale  =>  v·q ≈ (q_int8·q) * scale
+            scores *= self._scan_scales
+        return scores
 
-            # Ordenar por similitud descendente
-            similarities.sort(key=lambda x: x['similarity'], reverse=True)
+    @staticmethod
+    def _quantize_matrix(matrix: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Cuantizar matriz normalizada a fp16 o int8 (con escala por fila). Retorna (matriz, escalas)."""
+        if mode == 'fp16':
+            return matrix.astype(np.float16), None
+        if mode == 'int8':
+            scales = (np.abs(matrix).max(axis=1) / 127.0).astype(np.float32) + 1e-12
+            return np.round(matrix / scales[:, None]).astype(np.int8), scales
+        return matrix, None
+
+    def _build_index(self, matrix: np.ndarray):
+        """
+        Construir índice FAISS de producto interno (= coseno con vectores normalizados).
 
-            # Filtrar por threshold y limitar a top_k
-            similar_tables = [
-                table for table in similarities
-                if table['similarity'] >= config.rag.similarity_threshold
-            ][:top_k]
+        Con faiss_index_type="auto", esquemas pequeños usan IndexFlatIP (exacto, sin
+        entrenamiento) y a partir de config.rag.faiss_ivf_min_tables IndexIVFFlat con
+        nlist = sqrt(N). "hnsw" usa IndexHNSWFlat (grafo, búsqueda sub-lineal sin entrenamiento)
+        y "sq8" IndexScalarQuantizer de 8 bits (1/4 de memoria, producto punto int8 con SIMD).
+        """
+        if faiss is None or not config.rag.use_faiss or len(matrix) == 0:
+            return None
 
-            logger.info(f"🔍 Encontradas {len(similar_tables)} de {len(similarities)} tablas que superan threshold {config.rag.similarity_threshold}")
+        try:
+            dim = matrix.shape[1]
+            index_type = self._faiss_index_type(len(matrix))
+
+            if index_type == 'hnsw':
+                index = faiss.IndexHNSWFlat(dim, config.rag.faiss_hnsw_m, faiss.METRIC_INNER_PRODUCT)
+                index.hnsw.efSearch = config.rag.faiss_hnsw_ef_search
+            elif index_type == 'ivf':
+                nlist = int(np.sqrt(len(matrix)))
+                quantizer = faiss.IndexFlatIP(dim)
+                index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+                index.train(matrix)
+                index.nprobe = min(nlist, 16)
+            elif index_type == 'sq8':
+                index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit,
+                                                   faiss.METRIC_INNER_PRODUCT)
+                index.train(matrix)
+            else:
+                index = faiss.IndexFlatIP(dim)
+            index.add(matrix)
+            return index
+        except Exception as e:
+            logger.warning(f"No se pudo construir índice FAISS, usando búsqueda numpy: {e}")
+            return None
 
-            for table in similar_tables[:5]:  # Log top 5
-                logger.debug(f"  ✓ {table['table_name']}: {table['similarity']:.3f}")
+    @staticmethod
+    def _faiss_index_type(n_rows: int) -> str:
+        """Tipo de índice FAISS a usar para `n_rows` tablas: 'flat', 'ivf', 'hnsw' o 'sq8'."""
+        index_type = config.rag.faiss_index_type
+        if index_type == 'auto':
+            index_type = 'ivf' if n_rows >= config.rag.faiss_ivf_min_tables else 'flat'
+        return index_type
+
+    def _load_index_file(self, n_rows: int):
+        """
+        Leer el índice FAISS guardado junto a la matriz.
 
-            return similar_tables
+        Se descarta si no coincide con la matriz cargada o con el tipo configurado;
+        en ese caso se reconstruye en la primera búsqueda.
+        """
+        if faiss is None or not config.rag.use_faiss or not os.path.exists(self.index_path):
+            return None
 
+        try:
+            # read_index devuelve un Index genérico; downcast da acceso a hnsw/nprobe.
+            # El objeto C++ pertenece al wrapper original: se transfiere la propiedad.
+            raw_index = faiss.read_index(self.index_path)
+            index = faiss.downcast_index(raw_index)
+            raw_index.thisown, index.thisown = False, True
+            index_type = self._faiss_index_type(n_rows)
+            if index.ntotal != n_rows:
+                return None
+            if index_type == 'hnsw' and isinstance(index, faiss.IndexHNSWFlat):
+                index.hnsw.efSearch = config.rag.faiss_hnsw_ef_search
+                return index
+            if index_type == 'ivf' and isinstance(index, faiss.IndexIVFFlat):
+                index.nprobe = min(index.nlist, 16)
+                return index
+            if index_type == 'sq8' and isinstance(index, faiss.IndexScalarQuantizer):
+                return index
+            return None
         except Exception as e:
-            logger.error(f"❌ Error buscando tablas similares: {e}")
-            return []
+            logger.warning(f"No se pudo leer índice FAISS guardado, se reconstruirá: {e}")
+            return None
+
+    def _refresh_scan_index(self, rebuild_index: bool = True):
+        """
+        Regenerar índice FAISS y matriz de escaneo a partir del store.
+
+        La matriz cuantizada solo se construye sin índice FAISS: con índice las búsquedas
+        no la usan (para int8 con FAISS está faiss_index_type="sq8").
+        """
+        matrix = self._store.vectors
+        if rebuild_index:
+            self._index = self._build_index(matrix)
+        mode = config.rag.vector_quantization if self._index is None else 'none'
+        self._scan_matrix, self._scan_scales = self._quantize_matrix(matrix, mode)
+        self._scan_quantized = mode in ('fp16', 'int8')
+        self._scan_dirty = False
 
     def get_collection_stats(self) -> Dict[str, Any]:
         """Obtener estadísticas de la colección."""
@@ -1237,46 +2297,198 @@ class VectorStore:
 
         return {
             'total_tables': len(self.embeddings_data),
-            'storage_type': 'JSON + numpy',
+            'storage_type': 'numpy (.npy) + JSON',
+            'index_type': type(self._index).__name__ if self._index is not None else 'numpy',
             'initialized': self._initialized,
-            'storage_path': self.storage_path
+            'storage_path': self.vectors_path
         }
 
 
+# Encabezado del bloque de tablas de get_table_context
+_TABLE_CONTEXT_HEADER = "Tablas relevantes para esta consulta:\n"
+
+# Notas para tablas críticas en get_table_context: {subcadena del nombre: nota}, en orden de emisión
+_CRITICAL_TABLE_NOTES = {
+    'DOCTOS_PV_DET': "⚠️ IMPORTANTE: Filtrar DESCRIPCION1 para excluir VENTA GLOBAL y artículos de sistema",
+    'ARTICULOS': "⚠️ IMPORTANTE: Excluir artículos con NOMBRE conteniendo GLOBAL, CORTE, SISTEMA",
+    'DOCTOS_PV': "⚠️ IMPORTANTE: NO tiene columna SERIE (solo TIPO_DOCTO + FOLIO)",
+    'DOCTOS_VE': "⚠️ IMPORTANTE: NO tiene columna SERIE (solo TIPO_DOCTO + FOLIO)",
+}
+
+# Espera mínima entre intentos de recarga del esquema en segundo plano (_maybe_refresh_async)
+_SCHEMA_REFRESH_RETRY_SECONDS = 60
+
+# Prioridad de tablas del grafo de relaciones (_rank_graph_related)
+_GRAPH_DETAIL_PATTERN = _keyword_pattern(['codigo', 'clave', 'detalle', 'det', 'linea'])
+_GRAPH_CATALOG_PATTERN = _keyword_pattern(['tipo', 'grupo', 'categoria', 'familia'])
+_GRAPH_STOCK_PRICE_PATTERN = _keyword_pattern(['existencia', 'precio', 'costo'])
+
+# Tablas de negocio principales que se procesan primero (_compute_priorities)
+_PRIORITY_TABLE_PATTERN = _keyword_pattern(['ARTICULO', 'CLIENTE', 'PROVEEDOR', 'VENTA', 'COMPRA', 'FACTURA', 'PEDIDO'])
+
+
+def _stable_top_k(scores: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """
+    Índices de los k mayores scores en orden descendente, con empates en el orden original.
+
+    Equivale a np.argsort(-scores, kind='stable')[:k], pero selecciona con
+    np.partition (O(N)) y solo ordena los k elegidos.
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    kth_value = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth_value)
+    # Empates en el límite: los primeros en orden original, como el ordenamiento estable
+    ties = np.flatnonzero(scores == kth_value)[:k - len(above)]
+    selected = np.sort(np.concatenate([above, ties]))
+    return selected[np.argsort(-scores[selected], kind='stable')]
+
+
+def _table_stem(name_lower: str) -> str:
+    """
+    Singular aproximado de un nombre de tabla en minúsculas (regla de plurales en español).
+
+    'articulos' -> 'articulo', 'proveedores' -> 'proveedor', 'almacenes' -> 'almacen';
+    a diferencia de rstrip('s') nunca quita más de un plural ni toca nombres en 'ss'.
+    """
+    if len(name_lower) > 4 and name_lower.endswith('es') and name_lower[-3] in 'rlndj':
+        return name_lower[:-2]
+    if name_lower.endswith('s') and not name_lower.endswith('ss'):
+        return name_lower[:-1]
+    return name_lower
+
+
+class _TableFeatures(NamedTuple):
+    """Datos de una tabla que no dependen de la consulta (usados al re-puntuar resultados)."""
+    importance_base: float  # Volumen + conectividad + complejidad (sin bono de tabla principal)
+    name_lower: str
+    stem_lower: str  # Singular aproximado del nombre (ver _table_stem)
+    col_names_text: str  # Nombres de columnas en minúsculas unidos por '\n'
+    col_starts: Tuple[int, ...]  # Posición en col_names_text donde empieza cada columna
+
+
+def _table_features(name: str, row_count: int, fk_count: int, col_names: List[str]) -> _TableFeatures:
+    """Calcular la parte de importancia independiente de la consulta y los nombres en minúsculas."""
+    importance = 0.0
+
+    # Volumen de datos, normalizado logarítmicamente (10 registros = 0.1, 1000 = 0.5, 100k = 0.9, 1M+ = 1.0)
+    if row_count > 0:
+        importance += min(math.log10(row_count + 1) / 6, 1.0) * 0.4
+    elif row_count == 0:
+        # Penalizar tablas vacías
+        importance -= 0.3
+
+    # Conectividad: 1 FK = 0.2, 3 FKs = 0.6, 5+ FKs = 1.0
+    if fk_count > 0:
+        importance += min(fk_count / 5.0, 1.0) * 0.3
+
+    # Complejidad estructural: 5 cols = 0.1, 15 cols = 0.5, 30+ cols = 1.0
+    col_count = len(col_names)
+    if col_count > 5:
+        importance += min((col_count - 5) / 25.0, 1.0) * 0.2
+
+    col_names_lower = [col_name.lower() for col_name in col_names]
+    col_starts = []
+    position = 0
+    for col_name in col_names_lower:
+        col_starts.append(position)
+        position += len(col_name) + 1
+
+    name_lower = name.lower()
+    return _TableFeatures(importance, name_lower, _table_stem(name_lower), '\n'.join(col_names_lower), tuple(col_starts))
+
+
+def _count_matching_columns(features: _TableFeatures, pattern: "re.Pattern") -> int:
+    """
+    Contar columnas cuyo nombre contiene alguna palabra del patrón.
+
+    Un solo recorrido regex sobre todos los nombres unidos: las palabras no
+    contienen '\n', así que ninguna coincidencia cruza de una columna a otra y
+    toda columna con alguna palabra aporta al menos una coincidencia.
+    """
+    matched = set()
+    for match in pattern.finditer(features.col_names_text):
+        matched.add(bisect.bisect_right(features.col_starts, match.start()))
+    return len(matched)
+
+
 class SchemaManager:
     """Gestor principal del esquema con capacidades RAG."""
+
+    # Grafo de microsip_relationships.json compartido entre instancias (se relee si cambia el mtime)
+    _relationships_cache = None
+    _relationships_cache_mtime = None
+    _relationships_lock = threading.Lock()
     
     def __init__(self):
         self.embedding_generator = EmbeddingGenerator()
         self.vector_store = VectorStore()
         self.schema_cache = {}
         self.last_schema_update = None
+        self._schema_updated_monotonic = None  # time.monotonic() de last_schema_update (para el TTL)
         self.active_tables_cache = None
         self.relationships_graph = None
+        self._graph_related_scores = {}  # tabla -> [(tabla del grafo, score)] ordenadas por score
+        self._context_fragments = {}  # tabla -> (TableInfo, bloque de get_table_context)
+        self._columns_views = {}  # tabla -> (TableInfo, columnas para find_relevant_tables)
+        self._descriptions_lower = {}  # tabla -> (descripción, descripción en minúsculas)
+        self._query_embedding_cache = QueryEmbeddingCache(
+            maxsize=config.rag.query_embedding_cache_size,
+            ttl_seconds=config.rag.query_embedding_cache_ttl
+        )
         self._load_relationships_graph()
         
         # Auto-actualización
         self.auto_update_interval = 12 * 3600  # 12 horas en segundos
-        self._auto_update_thread = None
-        self._stop_auto_update = threading.Event()
+        # threading.Timer de un solo disparo; se reprograma al terminar solo si sigue siendo el actual
+        self._auto_update_timer = None
+        self._auto_update_lock = threading.Lock()
         self.start_auto_update_thread()
+
+        # Recarga del esquema en segundo plano antes de que expire el caché (hilo daemon:
+        # una recarga en curso no bloquea la salida del intérprete)
+        self._refresh_in_flight = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._last_refresh_attempt = 0.0
+        self._closed = False
+        atexit.register(self.close)
     
     def _load_relationships_graph(self):
         """Cargar grafo de relaciones de MicroSIP"""
+        self.relationships_graph = type(self)._get_relationships_graph()
+        self._graph_related_scores = {}
+
+    @classmethod
+    def _get_relationships_graph(cls) -> Dict[str, List[str]]:
+        """Leer microsip_relationships.json una sola vez por proceso (o cuando cambie el archivo)."""
         try:
-            import os
             rel_path = os.path.join(os.path.dirname(__file__), 'microsip_relationships.json')
-            if os.path.exists(rel_path):
-                with open(rel_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.relationships_graph = data.get('graph', {})
-                    logger.info(f"Grafo de relaciones cargado: {len(self.relationships_graph)} tablas con relaciones")
-            else:
-                self.relationships_graph = {}
+            if not os.path.exists(rel_path):
                 logger.warning("No se encontró microsip_relationships.json, continuando sin expansión de relaciones")
+                return {}
+
+            mtime = os.path.getmtime(rel_path)
+            with cls._relationships_lock:
+                if cls._relationships_cache is None or cls._relationships_cache_mtime != mtime:
+                    data = _load_json_file(rel_path)
+                    cls._relationships_cache = data.get('graph', {})
+                    cls._relationships_cache_mtime = mtime
+                    logger.info(f"Grafo de relaciones cargado: {len(cls._relationships_cache)} tablas con relaciones")
+                return cls._relationships_cache
         except Exception as e:
             logger.warning(f"Error cargando grafo de relaciones: {e}")
-            self.relationships_graph = {}
+            return {}
+
+    @classmethod
+    def invalidate_relationships_cache(cls):
+        """Descartar el grafo en memoria; la próxima instancia vuelve a leer el archivo."""
+        with cls._relationships_lock:
+            cls._relationships_cache = None
+            cls._relationships_cache_mtime = None
     
     def _get_fk_related_tables(self, table_name: str) -> List[str]:
         """
@@ -1306,16 +2518,30 @@ class SchemaManager:
             if ref_table and ref_table not in related:
                 related.append(ref_table)
         
-        # Tablas que referencian a esta (hijos)
-        for other_table_name, other_table_info in full_schema.items():
-            if other_table_name == table_name:
-                continue
-            
-            for fk in other_table_info.foreign_keys:
-                if fk.get('referenced_table') == table_name and other_table_name not in related:
-                    related.append(other_table_name)
+        # Tablas que referencian a esta (hijos), desde el índice inverso precalculado
+        reverse_fk = self.schema_cache.get('reverse_fk')
+        if reverse_fk is None:
+            reverse_fk = self.schema_cache['reverse_fk'] = self._build_reverse_fk_index(full_schema)
+
+        for other_table_name in reverse_fk.get(table_name, ()):
+            if other_table_name != table_name and other_table_name not in related:
+                related.append(other_table_name)
         
         return related
+
+    @staticmethod
+    def _build_reverse_fk_index(schema: Dict[str, TableInfo]) -> Dict[str, List[str]]:
+        """Construir índice tabla referenciada → tablas hijas (en orden del esquema, sin repetir)."""
+        reverse_fk = {}
+        for table_name, table_info in schema.items():
+            for fk in table_info.foreign_keys:
+                ref_table = fk.get('referenced_table')
+                if not ref_table:
+                    continue
+                children = reverse_fk.setdefault(ref_table, [])
+                if not children or children[-1] != table_name:
+                    children.append(table_name)
+        return reverse_fk
     
     def _adjust_scores_by_context(self, tables: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
         """
@@ -1339,58 +2565,49 @@ class SchemaManager:
 
         query_lower = query.lower()
         query_words = [w for w in query_lower.split() if len(w) > 3]  # Palabras significativas
+        # Una sola alternancia compilada por consulta: cada columna se revisa en una pasada
+        query_pattern = _keyword_pattern(query_words) if query_words else None
+
+        table_features = self.schema_cache.get('table_features', {})
 
         for table in tables:
+            features = table_features.get(table.get('name'))
+            if features is None:
+                features = _table_features(
+                    table.get('name', ''),
+                    table.get('row_count', 0),
+                    len(table.get('foreign_keys', [])),
+                    [col.get('name', '') for col in table.get('columns', [])]
+                )
+
             # === FACTOR 1: SIMILITUD SEMÁNTICA (ya viene de ChromaDB) ===
             semantic_score = table.get('similarity_score', 0.0)
 
             # === FACTOR 2: IMPORTANCIA DE TABLA ===
-            importance_score = 0.0
+            # Volumen, conectividad y complejidad vienen precalculados por tabla
+            importance_score = features.importance_base
 
-            # 2.1 Volumen de datos (normalizado 0-1)
-            row_count = table.get('row_count', 0)
-            if row_count > 0:
-                # Normalizar logarítmicamente (10 registros = 0.1, 1000 = 0.5, 100k = 0.9, 1M+ = 1.0)
-                import math
-                importance_score += min(math.log10(row_count + 1) / 6, 1.0) * 0.4
-            elif row_count == 0:
-                # Penalizar tablas vacías
-                importance_score -= 0.3
-
-            # 2.2 Conectividad (foreign keys)
-            fk_count = len(table.get('foreign_keys', []))
-            if fk_count > 0:
-                # Normalizar: 1 FK = 0.2, 3 FKs = 0.6, 5+ FKs = 1.0
-                importance_score += min(fk_count / 5.0, 1.0) * 0.3
-
-            # 2.3 Complejidad estructural (número de columnas)
-            col_count = len(table.get('columns', []))
-            if col_count > 5:
-                # Normalizar: 5 cols = 0.1, 15 cols = 0.5, 30+ cols = 1.0
-                importance_score += min((col_count - 5) / 25.0, 1.0) * 0.2
-
-            # 2.4 Si es tabla principal (no relacionada), bonificar
+            # Si es tabla principal (no relacionada), bonificar
             if not table.get('is_related', False):
                 importance_score += 0.1
 
             # === FACTOR 3: KEYWORD MATCHING ===
             keyword_score = 0.0
-            table_name = table.get('name', '').lower()
-            table_desc = table.get('description', '').lower()
+            table_name = features.name_lower
+            table_desc = self._description_lower(table.get('name', ''), table.get('description', ''))
 
-            # 3.1 Coincidencias en nombre de tabla (peso alto)
-            for word in query_words:
-                if word in table_name:
-                    keyword_score += 0.4
+            # 3.1 Coincidencias en nombre de tabla (peso alto); la alternancia descarta
+            # en una sola búsqueda las tablas sin ninguna palabra de la consulta en el nombre
+            if query_pattern is not None and query_pattern.search(table_name):
+                for word in query_words:
+                    if word in table_name:
+                        keyword_score += 0.4
 
             # 3.2 Coincidencias en nombres de columnas (peso medio)
+            # (solo se cuenta una vez por columna, aunque contenga varias palabras)
             column_matches = 0
-            for col in table.get('columns', []):
-                col_name = col.get('name', '').lower()
-                for word in query_words:
-                    if word in col_name:
-                        column_matches += 1
-                        break  # Solo contar una vez por columna
+            if query_pattern is not None:
+                column_matches = _count_matching_columns(features, query_pattern)
 
             if column_matches > 0:
                 # Normalizar: 1 match = 0.2, 3 matches = 0.6, 5+ matches = 1.0
@@ -1419,7 +2636,7 @@ class SchemaManager:
             table['similarity_score'] = max(0, min(1, final_score))  # Clamp a [0, 1]
 
         # Reordenar por score final
-        tables.sort(key=lambda x: x['similarity_score'], reverse=True)
+        tables.sort(key=itemgetter('similarity_score'), reverse=True)
 
         # Log detallado de scoring
         logger.info("🎯 Scoring multi-factor aplicado:")
@@ -1447,119 +2664,140 @@ class SchemaManager:
         Returns:
             Lista expandida de tablas incluyendo las relacionadas
         """
-        expanded = []
-        added_tables = set()
-        
+        full_schema = self.schema_cache.get('full_schema', {})
+
         # Primero agregar las tablas originales
-        for table in tables:
-            table_name = table['name']
-            expanded.append(table)
-            added_tables.add(table_name)
+        expanded = list(tables)
+        added_tables = {table['name'] for table in tables}
         
-        # Expandir dinámicamente usando foreign keys reales
-        for table in tables[:3]:  # Solo las 3 más relevantes
-            table_name = table['name']
-            
-            # Obtener tablas relacionadas por FK
-            fk_related = self._get_fk_related_tables(table_name)
-            
-            for related_name in fk_related[:max_related]:
-                if related_name not in added_tables and related_name in self.schema_cache.get('full_schema', {}):
-                    table_info = self.schema_cache['full_schema'][related_name]
-                    
-                    related_table = {
-                        'name': related_name,
-                        'similarity_score': table['similarity_score'] * 0.75,
-                        'description': f"Relacionada por FK con {table_name}",
-                        'row_count': table_info.row_count,
-                        'columns': [
-                            {'name': col['name'], 'type': col['data_type'], 'nullable': col['nullable']}
-                            for col in table_info.columns
-                        ],
-                        'primary_keys': table_info.primary_keys,
-                        'foreign_keys': table_info.foreign_keys,
-                        'relationships': db.get_table_relationships(related_name),
-                        'is_related': True,
-                        'relation_type': 'foreign_key'
-                    }
-                    
-                    expanded.append(related_table)
-                    added_tables.add(related_name)
-        
-        # Luego agregar tablas relacionadas para cada una
-        for table in tables[:3]:  # Solo expandir las 3 más relevantes
-            table_name = table['name']
-            
-            if table_name not in self.relationships_graph:
-                continue
-            
-            related_tables = self.relationships_graph[table_name]
-            
-            # Priorizar tablas relacionadas por importancia semántica
-            scored_related = []
-            for rel_table in related_tables:
-                if rel_table in added_tables:
-                    continue
-                
-                # Calcular score de importancia
-                score = 0
-                rel_lower = rel_table.lower()
-                
-                # Tablas de detalle/códigos/claves son muy importantes
-                if any(k in rel_lower for k in ['codigo', 'clave', 'detalle', 'det', 'linea']):
-                    score += 10
-                
-                # Catálogos relacionados
-                if any(k in rel_lower for k in ['tipo', 'grupo', 'categoria', 'familia']):
-                    score += 7
-                
-                # Existencias y precios muy importantes
-                if any(k in rel_lower for k in ['existencia', 'precio', 'costo']):
-                    score += 9
-                
-                # Relaciones con el nombre de la tabla principal
-                table_base = table_name.rstrip('S')  # ARTICULOS -> ARTICULO
-                if table_base.lower() in rel_lower:
-                    score += 8
-                
-                scored_related.append((rel_table, score))
-            
-            # Ordenar por score y tomar las mejores
-            scored_related.sort(key=lambda x: x[1], reverse=True)
-            
-            # Agregar las tablas relacionadas más importantes
-            for rel_table, score in scored_related[:max_related]:
-                if rel_table in self.schema_cache.get('full_schema', {}):
-                    table_info = self.schema_cache['full_schema'][rel_table]
-                    
-                    related_table = {
-                        'name': rel_table,
-                        'similarity_score': table['similarity_score'] * 0.7,  # Score reducido para relacionadas
-                        'description': f"Tabla relacionada con {table_name}",
-                        'row_count': table_info.row_count,
-                        'columns': [
-                            {
-                                'name': col['name'],
-                                'type': col['data_type'],
-                                'nullable': col['nullable']
-                            }
-                            for col in table_info.columns
-                        ],
-                        'primary_keys': table_info.primary_keys,
-                        'foreign_keys': table_info.foreign_keys,
-                        'relationships': db.get_table_relationships(rel_table),
-                        'is_related': True,  # Marcar como tabla relacionada
-                        'related_to': table_name
-                    }
-                    
-                    expanded.append(related_table)
-                    added_tables.add(rel_table)
+        # Una sola pasada por fuente, en orden de prioridad: primero foreign keys reales,
+        # luego el grafo de relaciones de MicroSIP. Solo se expanden las 3 más relevantes.
+        for source in ('foreign_key', 'graph'):
+            for table in tables[:3]:
+                table_name = table['name']
+
+                if source == 'foreign_key':
+                    candidates = self._get_fk_related_tables(table_name)[:max_related]
+                else:
+                    candidates = self._rank_graph_related(table_name, added_tables, max_related)
+
+                for related_name in candidates:
+                    if related_name not in added_tables and related_name in full_schema:
+                        expanded.append(self._build_related_record(
+                            related_name, full_schema[related_name], table, source
+                        ))
+                        added_tables.add(related_name)
         
         if len(expanded) > len(tables):
             logger.info(f"Expandidas {len(tables)} tablas a {len(expanded)} (incluyendo {len(expanded) - len(tables)} relacionadas)")
         
         return expanded
         
+    def _rank_graph_related(self, table_name: str, added_tables: set, max_related: int) -> List[str]:
+        """Tablas del grafo de relaciones aún no agregadas, ordenadas por importancia semántica."""
+        scored_related = self._graph_related_scores.get(table_name)
+        if scored_related is None:
+            scored_related = self._graph_related_scores[table_name] = self._score_graph_related(table_name)
+
+        # La lista ya está ordenada por score: basta tomar las primeras no agregadas
+        return list(islice((rel_table for rel_table, _ in scored_related if rel_table not in added_tables),
+                           max_related))
+
+    def _score_graph_related(self, table_name: str) -> List[Tuple[str, int]]:
+        """
+        Puntuar las tablas del grafo relacionadas con `table_name`.
+
+        El score solo depende de los nombres, así que se calcula y ordena una vez
+        por tabla (de mayor a menor; los empates conservan el orden del grafo).
+        """
+        features = self.schema_cache.get('table_features', {}).get(table_name)
+        stem_lower = features.stem_lower if features is not None else _table_stem(table_name.lower())
+
+        scored_related = []
+        for rel_table in self.relationships_graph.get(table_name, ()):
+            score = 0
+            rel_lower = rel_table.lower()
+            
+            # Tablas de detalle/códigos/claves son muy importantes
+            if _GRAPH_DETAIL_PATTERN.search(rel_lower):
+                score += 10
+            
+            # Catálogos relacionados
+            if _GRAPH_CATALOG_PATTERN.search(rel_lower):
+                score += 7
+            
+            # Existencias y precios muy importantes
+            if _GRAPH_STOCK_PRICE_PATTERN.search(rel_lower):
+                score += 9
+            
+            # Relaciones con el nombre de la tabla principal (ARTICULOS -> articulo)
+            if stem_lower in rel_lower:
+                score += 8
+            
+            scored_related.append((rel_table, score))
+
+        scored_related.sort(key=itemgetter(1), reverse=True)
+        return scored_related
+
+    def _columns_view(self, table_name: str, table_info: TableInfo) -> List[Dict[str, Any]]:
+        """
+        Columnas (name, type, nullable) que devuelve find_relevant_tables para una tabla.
+
+        Se calcula una vez por objeto TableInfo (una recarga del esquema crea objetos
+        nuevos); la lista es compartida entre consultas y no debe modificarse.
+        """
+        cached = self._columns_views.get(table_name)
+        if cached is None or cached[0] is not table_info:
+            cached = (table_info, [
+                {
+                    'name': col['name'],
+                    'type': col['data_type'],
+                    'nullable': col['nullable']
+                }
+                for col in table_info.columns
+            ])
+            self._columns_views[table_name] = cached
+        return cached[1]
+
+    def _description_lower(self, table_name: str, description: str) -> str:
+        """
+        Descripción en minúsculas para el keyword matching de _adjust_scores_by_context.
+
+        Las descripciones vienen de los metadatos del vector store y se repiten entre
+        consultas: se recalcula solo si el texto de la tabla cambió.
+        """
+        cached = self._descriptions_lower.get(table_name)
+        if cached is None or cached[0] != description:
+            cached = (description, description.lower())
+            self._descriptions_lower[table_name] = cached
+        return cached[1]
+
+    def _build_related_record(self, name: str, table_info: TableInfo, parent: Dict[str, Any],
+                              source: str) -> Dict[str, Any]:
+        """Construir la entrada de una tabla relacionada (por FK o por grafo) con `parent`."""
+        # Score reducido respecto a la tabla principal (menos aún si solo viene del grafo)
+        if source == 'foreign_key':
+            score_factor, description = 0.75, f"Relacionada por FK con {parent['name']}"
+        else:
+            score_factor, description = 0.7, f"Tabla relacionada con {parent['name']}"
+
+        record = {
+            'name': name,
+            'similarity_score': parent['similarity_score'] * score_factor,
+            'description': description,
+            'row_count': table_info.row_count,
+            'columns': self._columns_view(name, table_info),
+            'primary_keys': table_info.primary_keys,
+            'foreign_keys': table_info.foreign_keys,
+            'relationships': {},  # Se completa en find_relevant_tables para las tablas finales
+            'is_related': True  # Marcar como tabla relacionada
+        }
+        if source == 'foreign_key':
+            record['relation_type'] = 'foreign_key'
+        else:
+            record['related_to'] = parent['name']
+        return record
+
     @timing_decorator("Schema Loading")
     def load_and_process_schema(self, force_refresh: bool = False, skip_embeddings: bool = False) -> Dict[str, Any]:
         """
@@ -1575,16 +2813,18 @@ class SchemaManager:
                 # Verificar si ya tenemos embeddings completos
                 embeddings_complete = self.schema_cache.get('embeddings_pending', True) == False
                 if embeddings_complete or skip_embeddings:
-                    logger.info("✓ Usando esquema procesado desde caché")
+                    logger.debug("✓ Usando esquema procesado desde caché")
                 return self.schema_cache
                 # Si faltan embeddings, continuar procesándolos
             
             logger.info("🔄 Cargando esquema completo de la base de datos...")
             
-            # Cargar esquema de la base de datos (usa caché si existe)
+            # Cargar esquema de la base de datos (usa caché si existe). Si solo faltan
+            # embeddings se reutiliza la estructura ya cargada; la introspección completa
+            # del catálogo se repite únicamente con force_refresh.
             full_schema = self.schema_cache.get('full_schema') if not force_refresh else None
             if not full_schema:
-                full_schema = db.get_full_schema(force_refresh=True)
+                full_schema = db.get_full_schema(force_refresh=force_refresh)
             
             if not full_schema:
                 raise Exception("No se pudo cargar el esquema de la base de datos")
@@ -1597,11 +2837,25 @@ class SchemaManager:
                 logger.info(f"🧠 Procesando TODAS las tablas para embeddings ({len(full_schema)} tablas)...")
                 table_embeddings = self._process_tables_for_embeddings(full_schema, max_tables=None)
             
-            # Agregar embeddings al almacén vectorial
+            # Agregar embeddings al almacén vectorial; las tablas sin cambios ya están
+            # en embeddings.npy / metadata.json y no se reescriben
             try:
-                logger.info("💾 Guardando embeddings en almacén vectorial...")
-                self.vector_store.add_table_embeddings(table_embeddings)
-                logger.info("✅ Embeddings guardados correctamente")
+                changed_embeddings = {name: data for name, data in table_embeddings.items()
+                                      if not data.get('unchanged')}
+                if changed_embeddings:
+                    logger.info("💾 Guardando embeddings en almacén vectorial...")
+                    self.vector_store.add_table_embeddings(changed_embeddings)
+                    logger.info("✅ Embeddings guardados correctamente")
+                elif table_embeddings:
+                    logger.info("✓ Embeddings sin cambios, se conserva el almacén vectorial en disco")
+                # Tablas borradas de la BD: quitar sus embeddings para que no salgan en búsquedas.
+                # Se compara con el listado del catálogo, no con full_schema, que omite las
+                # tablas cuya carga falló (esas conservan su embedding)
+                catalog_tables = db.get_catalog_table_names()
+                if not skip_embeddings and catalog_tables is not None:
+                    self.vector_store.remove_tables(
+                        [name for name in self.vector_store.embeddings_data if name not in catalog_tables]
+                    )
             except Exception as e:
                 logger.warning(f"⚠️ Error guardando embeddings, continúo sin persistencia: {e}")
                 # No borrar table_embeddings si falla el guardado
@@ -1610,16 +2864,19 @@ class SchemaManager:
             active_tables = self._identify_active_tables(full_schema)
             
             # Actualizar caché (aunque falle el vector store)
+            self._query_embedding_cache.clear()
             self.schema_cache = {
                 'full_schema': full_schema,
                 'table_embeddings': table_embeddings,
                 'active_tables': active_tables,
                 'stats': self._calculate_schema_stats(full_schema, active_tables),
+                'table_features': self._build_table_features(full_schema),
+                'reverse_fk': self._build_reverse_fk_index(full_schema),
                 'is_basic': False,
                 'embeddings_pending': skip_embeddings  # False si se procesaron todos
             }
             
-            self.last_schema_update = datetime.now()
+            self._mark_schema_updated()
             self.active_tables_cache = active_tables
             
             logger.info(f"✅ Esquema procesado completamente: {len(full_schema)} tablas totales, "
@@ -1660,11 +2917,13 @@ class SchemaManager:
                 'table_embeddings': table_embeddings,
                 'active_tables': active_tables,
                 'stats': self._calculate_schema_stats(full_schema, active_tables),
+                'table_features': self._build_table_features(full_schema),
+                'reverse_fk': self._build_reverse_fk_index(full_schema),
                 'is_basic': True,  # Marcar como carga básica
                 'embeddings_pending': True  # Indicar que faltan embeddings
             }
 
-            self.last_schema_update = datetime.now()
+            self._mark_schema_updated()
             self.active_tables_cache = active_tables
 
             stats = self.schema_cache.get('stats', {})
@@ -1680,14 +2939,70 @@ class SchemaManager:
                 return self.schema_cache
             raise
     
+    def _mark_schema_updated(self):
+        """Registrar la actualización del esquema (fecha visible y reloj monotónico para el TTL)."""
+        self.last_schema_update = datetime.now()
+        self._schema_updated_monotonic = time.monotonic()
+
+    def _schema_cache_age(self) -> Optional[float]:
+        """Segundos desde la última actualización del esquema, o None si no hay caché."""
+        if not self.schema_cache or self._schema_updated_monotonic is None:
+            return None
+        return time.monotonic() - self._schema_updated_monotonic
+
     def _is_schema_cache_valid(self) -> bool:
         """Verificar si el caché del esquema sigue siendo válido."""
-        if not self.schema_cache or not self.last_schema_update:
-            return False
-        
-        time_diff = datetime.now() - self.last_schema_update
-        return time_diff < timedelta(minutes=config.rag.cache_ttl_minutes)
+        age = self._schema_cache_age()
+        return age is not None and age < config.rag.cache_ttl_minutes * 60
     
+    def _maybe_refresh_async(self):
+        """
+        Recargar el esquema en segundo plano si el caché pasó config.rag.schema_refresh_ahead de su TTL.
+
+        Las consultas siguen usando el caché actual; load_and_process_schema lo
+        reemplaza con una sola asignación al terminar. Desactivado con schema_refresh_ahead = 0.
+        """
+        if config.rag.schema_refresh_ahead <= 0 or self._closed:
+            return
+
+        age = self._schema_cache_age()
+        if age is None or self.schema_cache.get('is_basic'):
+            return
+
+        ttl_seconds = config.rag.cache_ttl_minutes * 60
+        if age < ttl_seconds * config.rag.schema_refresh_ahead:
+            return
+
+        with self._refresh_lock:
+            # Si una recarga falló, no reintentar en cada consulta
+            if (self._refresh_in_flight.is_set()
+                    or time.monotonic() - self._last_refresh_attempt < _SCHEMA_REFRESH_RETRY_SECONDS):
+                return
+            self._refresh_in_flight.set()
+            self._last_refresh_attempt = time.monotonic()
+
+        logger.info("🔄 Caché de esquema por expirar, recargando en segundo plano...")
+        try:
+            threading.Thread(target=self._background_refresh, name="SchemaRefresh", daemon=True).start()
+        except Exception as e:
+            self._refresh_in_flight.clear()
+            logger.warning(f"⚠️ No se pudo iniciar la recarga del esquema en segundo plano: {e}")
+
+    def _background_refresh(self):
+        """Recarga ejecutada en el hilo schema-refresh."""
+        started = datetime.now()
+        try:
+            self.load_and_process_schema(force_refresh=True)
+            # load_and_process_schema no propaga errores si ya hay caché: verificar que se reemplazó
+            if self.last_schema_update and self.last_schema_update >= started:
+                logger.info("✅ Esquema recargado en segundo plano")
+            else:
+                logger.warning("⚠️ Falló la recarga en segundo plano, se sigue usando el esquema anterior")
+        except Exception as e:
+            logger.error(f"❌ Error recargando esquema en segundo plano: {e}")
+        finally:
+            self._refresh_in_flight.clear()
+
     def _process_tables_for_embeddings(self, schema: Dict[str, TableInfo], max_tables: int = None) -> Dict[str, Dict[str, Any]]:
         """
         Procesar tablas para generar embeddings con priorización inteligente.
@@ -1699,155 +3014,294 @@ class SchemaManager:
         table_embeddings = {}
 
         # Limitar el procesamiento a tablas más importantes primero
-        tables_to_process = []
-        
-        for table_name, table_info in schema.items():
-            # Priorizar tablas con datos y relaciones
-            priority = 0
+        # (orden estable: empates conservan el orden del esquema)
+        table_names = list(schema)
+        # Aplicar límite si se especifica (selección parcial: solo se ordenan las elegidas)
+        order = _stable_top_k(self._compute_priorities(schema), max_tables)
+        limited_tables = [(table_names[i], schema[table_names[i]]) for i in order]
+        fingerprints = {table_name: _description_fingerprint(table_info)
+                        for table_name, table_info in limited_tables}
+
+        # Tablas sin cambios de estructura: reutilizar descripción y embedding guardados
+        # (la huella no cubre el contenido de las muestras: con muestras se regenera todo)
+        reused = {}
+        if config.rag.reuse_table_descriptions and not config.rag.include_sample_data:
+            reused = self._reuse_stored_embeddings(limited_tables, fingerprints)
+            if reused:
+                logger.info(f"♻️ Reutilizando descripción y embedding de {len(reused)}/{len(limited_tables)} tablas sin cambios")
+        pending_tables = [(table_name, table_info) for table_name, table_info in limited_tables
+                          if table_name not in reused]
+
+        total = len(pending_tables)
+        stats_before = dict(self.embedding_generator.batch_stats)
 
-            # Tablas con relaciones son MUY importantes (catálogos principales)
-            priority += len(table_info.foreign_keys) * 15
+        logger.info(f"📊 Iniciando generación de embeddings para {total} tablas...")
 
-            # Tablas con muchas columnas suelen ser importantes
-            priority += len(table_info.columns) * 2
+        # Pipeline por bloques: mientras la API genera los embeddings de un bloque (en segundo
+        # plano), se obtienen las muestras (BD) y descripciones (CPU) del siguiente
+        chunk_size = max(1, config.rag.embedding_pipeline_chunk)
+        embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-pipeline")
+        # Un solo pool de procesos para todos los bloques, decidido por el total pendiente
+        describe_executor = TableDescriptor.create_description_pool(total)
+        pending = []
+        try:
+            for start in range(0, total, chunk_size):
+                chunk = pending_tables[start:start + chunk_size]
+
+                # Muestra de datos de las tablas con registros (en paralelo), solo si se habilitó
+                samples = {}
+                if config.rag.include_sample_data:
+                    samples = self._fetch_table_samples(
+                        [table_name for table_name, table_info in chunk if table_info.row_count != 0]  # -1 o > 0
+                    )
+                sample_data_list = [samples.get(table_name, []) for table_name, _ in chunk]
+
+                # Generar descripciones semánticas ENRIQUECIDAS (en paralelo si hay muchas tablas)
+                descriptions = TableDescriptor.describe_tables_bulk(
+                    [table_info for _, table_info in chunk], sample_data_list,
+                    executor=describe_executor
+                )
 
-            # Tablas con datos conocidos (pero no penalizar si row_count = -1)
-            if table_info.row_count > 0:
-                priority += min(table_info.row_count / 1000, 50)
-            elif table_info.row_count == -1:
-                # Tabla sin contar aún, asumir prioridad media
-                priority += 10
+                described = [
+                    (table_name, table_info, description)
+                    for (table_name, table_info), description in zip(chunk, descriptions)
+                    if description is not None
+                ]
+
+                # Embeddings del bloque en batches paralelos, sin esperar a que terminen
+                logger.info(f"🔄 [{start + len(chunk)}/{total}] Generando embeddings de {len(described)} descripciones en batches...")
+                future = embed_executor.submit(
+                    self.embedding_generator.generate_batch_embeddings,
+                    [description for _, _, description in described]
+                )
+                pending.append((described, future))
+
+            results = [(described, future.result()) for described, future in pending]
+        finally:
+            embed_executor.shutdown(wait=True)
+            if describe_executor is not None:
+                describe_executor.shutdown(wait=True)
+
+        generated = {
+            table_name: (description, embedding)
+            for described, embeddings in results
+            for (table_name, _, description), embedding in zip(described, embeddings)
+        }
 
-            # Tablas con nombres importantes
-            name_upper = table_name.upper()
-            if any(kw in name_upper for kw in ['ARTICULO', 'CLIENTE', 'PROVEEDOR', 'VENTA', 'COMPRA', 'FACTURA', 'PEDIDO']):
-                priority += 20
+        # Armar el resultado en orden de prioridad (generadas y reutilizadas)
+        log_each_table = logger.is_debug_enabled()
+        for table_name, table_info in limited_tables:
+            if table_name in generated:
+                (description, embedding), unchanged = generated[table_name], False
+            elif table_name in reused:
+                description, embedding, unchanged = reused[table_name]
+            else:
+                continue
+            table_embeddings[table_name] = {
+                'embedding': embedding,
+                'description': description,
+                'fingerprint': fingerprints[table_name],
+                'unchanged': unchanged,  # Igual a lo guardado en el almacén vectorial
+                'row_count': table_info.row_count,
+                'is_active': table_info.is_active,
+                'column_count': len(table_info.columns),
+                'primary_key_count': len(table_info.primary_keys),
+                'foreign_key_count': len(table_info.foreign_keys),
+                'index_count': len(table_info.indexes),
+                'has_foreign_keys': len(table_info.foreign_keys) > 0,
+                'has_unique_indexes': any(idx.get('unique', False) for idx in table_info.indexes),
+                'table_info': table_info
+            }
+            if log_each_table:
+                logger.debug(f"  ✓ {table_name}: embedding listo ({len(description)} caracteres de descripción)")
+
+        # Resumen: reutilizadas sin describir, descripciones con embedding en caché y enviadas a la API
+        stats = self.embedding_generator.batch_stats
+        logger.info(f"✅ Procesadas {len(table_embeddings)}/{len(limited_tables)} tablas para embeddings "
+                    f"({len(reused)} reutilizadas, "
+                    f"{stats['cache_hits'] - stats_before['cache_hits']} desde caché, "
+                    f"{stats['api_texts'] - stats_before['api_texts']} enviadas a la API)")
+        return table_embeddings
 
-            tables_to_process.append((table_name, table_info, priority))
+    def _reuse_stored_embeddings(self, tables: List[Tuple[str, TableInfo]],
+                                 fingerprints: Dict[str, str]) -> Dict[str, Tuple[str, np.ndarray, bool]]:
+        """
+        Descripción y embedding guardados de las tablas cuya huella no cambió.
 
-        # Ordenar por prioridad
-        tables_to_process.sort(key=lambda x: x[2], reverse=True)
+        Si solo cambió el número de registros se actualiza el segmento de volumen de la
+        descripción; el embedding se conserva hasta que cambie la huella.
 
-        # Aplicar límite si se especifica
-        if max_tables is not None:
-            limited_tables = tables_to_process[:max_tables]
-        else:
-            limited_tables = tables_to_process
+        Returns:
+            {tabla: (descripción, embedding, True si nada difiere de lo guardado)}
+        """
+        reused = {}
+        for table_name, table_info in tables:
+            stored = self.vector_store.get_stored_embedding(table_name)
+            if stored is None:
+                continue
+            data, embedding = stored
+            if data.get('fingerprint') != fingerprints[table_name]:
+                continue
 
-        # Procesar tablas con progreso DETALLADO
-        total = len(limited_tables)
-        processed = 0
+            description = data['description']
+            old_row_count = data.get('row_count', 0)
+            if old_row_count != table_info.row_count and table_info.row_count > 0:
+                # La huella garantiza que la descripción guardada también tiene segmento de volumen
+                description = description.replace(
+                    f" | Volumen: {TableDescriptor._describe_data_volume(old_row_count)}",
+                    f" | Volumen: {TableDescriptor._describe_data_volume(table_info.row_count)}", 1)
+            unchanged = (old_row_count == table_info.row_count
+                         and data.get('is_active', True) == table_info.is_active)
+            reused[table_name] = (description, embedding, unchanged)
+        return reused
 
-        logger.info(f"📊 Iniciando generación de embeddings para {total} tablas...")
+    @staticmethod
+    def _compute_priorities(schema: Dict[str, TableInfo]) -> np.ndarray:
+        """
+        Prioridad de cada tabla (en el orden del esquema) para generar embeddings.
 
-        for table_name, table_info, priority in limited_tables:
-            try:
-                # Log ANTES de procesar cada tabla
-                logger.info(f"🔄 [{processed + 1}/{total}] Procesando: {table_name}")
+        Una sola pasada llena arreglos paralelos; la suma ponderada se hace con numpy.
+        """
+        n = len(schema)
+        fk_counts = np.empty(n, dtype=np.float64)
+        col_counts = np.empty(n, dtype=np.float64)
+        row_counts = np.empty(n, dtype=np.float64)
+        has_keyword = np.empty(n, dtype=bool)
+        for i, (table_name, table_info) in enumerate(schema.items()):
+            fk_counts[i] = len(table_info.foreign_keys)
+            col_counts[i] = len(table_info.columns)
+            row_counts[i] = table_info.row_count
+            has_keyword[i] = _PRIORITY_TABLE_PATTERN.search(table_name.upper()) is not None
+
+        # Tablas con relaciones son MUY importantes (catálogos principales) y
+        # tablas con muchas columnas suelen ser importantes
+        priorities = fk_counts * 15 + col_counts * 2
+
+        # Tablas con datos conocidos (pero no penalizar si row_count = -1:
+        # tabla sin contar aún, asumir prioridad media)
+        priorities += np.where(row_counts > 0, np.minimum(row_counts / 1000, 50),
+                               np.where(row_counts == -1, 10, 0))
+
+        # Tablas con nombres importantes
+        priorities += has_keyword * 20
+        return priorities
+    
+    def _fetch_table_samples(self, table_names: List[str]) -> Dict[str, List[List[Any]]]:
+        """
+        Obtener muestras de hasta 10 registros por tabla con consultas concurrentes.
 
-                # Obtener muestra de datos para TODAS las tablas con registros
-                sample_data = []
-                if table_info.row_count != 0:  # -1 o > 0
-                    try:
-                        # Intentar obtener muestra (limitada a 10 registros)
-                        sample_query = f"SELECT FIRST 10 * FROM {table_name}"
-                        result = db.execute_query(sample_query)
-                        if result and result.data:
-                            sample_data = result.data[:10]
-                            logger.debug(f"  ✓ Obtenida muestra de {len(sample_data)} registros")
-                    except Exception as e:
-                        # No abortar si falla la muestra, continuar sin ella
-                        logger.debug(f"  ⚠ No se pudo obtener muestra: {str(e)[:50]}")
+        Cada consulta toma su propia conexión del pool de la BD. Una tabla que falla
+        o tarda más de config.rag.sample_fetch_timeout se queda sin muestra; el mismo
+        límite se aplica a la sentencia en el servidor, así que al salir todas las
+        conexiones han vuelto al pool.
+        """
+        samples = {}
+        if not table_names:
+            return samples
 
-                # Generar descripción semántica ENRIQUECIDA
-                description = TableDescriptor.describe_table(table_info, sample_data)
-                
-                # Generar embedding
-                embedding = self.embedding_generator.generate_embedding(description)
-                
-                table_embeddings[table_name] = {
-                    'embedding': embedding,
-                    'description': description,
-                    'row_count': table_info.row_count,
-                    'is_active': table_info.is_active,
-                    'column_count': len(table_info.columns),
-                    'primary_key_count': len(table_info.primary_keys),
-                    'foreign_key_count': len(table_info.foreign_keys),
-                    'index_count': len(table_info.indexes),
-                    'has_foreign_keys': len(table_info.foreign_keys) > 0,
-                    'has_unique_indexes': any(idx.get('unique', False) for idx in table_info.indexes),
-                    'table_info': table_info
-                }
-                
-                processed += 1
+        max_workers = max(1, min(config.rag.sample_fetch_workers, len(table_names)))
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="samples")
+        log_each_table = logger.is_debug_enabled()
+        failed = 0
+        try:
+            timeout = config.rag.sample_fetch_timeout
+            futures = [(table_name, executor.submit(db.get_table_sample, table_name, 10, timeout))
+                       for table_name in table_names]
+            for table_name, future in futures:
+                try:
+                    samples[table_name] = future.result(timeout=timeout)
+                    if log_each_table:
+                        logger.debug(f"  ✓ Obtenida muestra de {len(samples[table_name])} registros para {table_name}")
+                except Exception as e:
+                    # No abortar si falla la muestra, continuar sin ella
+                    failed += 1
+                    if log_each_table:
+                        logger.debug(f"  ⚠ No se pudo obtener muestra de {table_name}: {str(e)[:50]}")
+        finally:
+            # Las que aún no empezaron se cancelan; las que corren terminan por el timeout
+            # de la sentencia y devuelven su conexión al pool
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if failed:
+            logger.info(f"⚠️ {failed}/{len(table_names)} tablas sin muestra de datos (detalle en nivel DEBUG)")
+        return samples
 
-                # Log DESPUÉS de completar cada tabla
-                logger.info(f"✓ [{processed}/{total}] {table_name} completada ({(processed/total*100):.1f}%)")
-                
-            except Exception as e:
-                logger.error(f"✗ Error procesando tabla {table_name}: {str(e)}")
-                # Continuar con la siguiente tabla
-                processed += 1
-                continue
-        
-        logger.info(f"✅ Procesadas {len(table_embeddings)}/{total} tablas para embeddings")
-        return table_embeddings
-    
     def _identify_active_tables(self, schema: Dict[str, TableInfo]) -> List[str]:
         """Identificar tablas activas usando heurísticas avanzadas."""
-        active_tables = []
-        
-        # Ordenar por relevancia
-        tables_by_relevance = []
-        
-        for table_name, table_info in schema.items():
-            relevance_score = 0
-            
-            # Factor 1: Número de registros
-            if table_info.row_count > 0:
-                relevance_score += min(table_info.row_count / 1000, 100)
-            
-            # Factor 2: Relaciones activas
-            relevance_score += len(table_info.foreign_keys) * 10
-            
-            # Factor 3: Nombre no obsoleto
-            if table_info.is_active:
-                relevance_score += 20
-            
-            # Factor 4: Complejidad (más columnas = más importante)
-            relevance_score += len(table_info.columns) * 2
-            
-            # Factor 5: Tiene clave primaria
-            if table_info.primary_keys:
-                relevance_score += 15
-            
-            tables_by_relevance.append((table_name, relevance_score, table_info))
-        
-        # Ordenar por relevancia
-        tables_by_relevance.sort(key=lambda x: x[1], reverse=True)
-        
-        # Seleccionar tablas activas
-        for table_name, score, table_info in tables_by_relevance:
-            if score > 10:  # Threshold mínimo
-                active_tables.append(table_name)
-        
-        return active_tables
+        table_names = list(schema)
+        n = len(table_names)
+        row_counts = np.empty(n, dtype=np.float64)
+        fk_counts = np.empty(n, dtype=np.float64)
+        col_counts = np.empty(n, dtype=np.float64)
+        is_active = np.empty(n, dtype=bool)
+        has_pk = np.empty(n, dtype=bool)
+        for i, table_info in enumerate(schema.values()):
+            row_counts[i] = table_info.row_count
+            fk_counts[i] = len(table_info.foreign_keys)
+            col_counts[i] = len(table_info.columns)
+            is_active[i] = table_info.is_active
+            has_pk[i] = bool(table_info.primary_keys)
+
+        # Factor 1: Número de registros
+        relevance = np.where(row_counts > 0, np.minimum(row_counts / 1000, 100), 0)
+        # Factor 2: Relaciones activas
+        relevance += fk_counts * 10
+        # Factor 3: Nombre no obsoleto
+        relevance += is_active * 20
+        # Factor 4: Complejidad (más columnas = más importante)
+        relevance += col_counts * 2
+        # Factor 5: Tiene clave primaria
+        relevance += has_pk * 15
+
+        # Seleccionar las que superan el threshold mínimo y ordenar solo esas (estable)
+        candidates = np.flatnonzero(relevance > 10)
+        order = candidates[np.argsort(-relevance[candidates], kind='stable')]
+        return [table_names[i] for i in order]
     
     def _calculate_schema_stats(self, schema: Dict[str, TableInfo], 
                               active_tables: List[str]) -> Dict[str, Any]:
-        """Calcular estadísticas del esquema."""
-        total_rows = sum(table.row_count for table in schema.values() if table.row_count > 0)
-        
+        """Calcular estadísticas del esquema (una sola pasada por las tablas)."""
+        total_rows = tables_with_data = tables_with_fk = 0
+        for table in schema.values():
+            row_count = table.row_count
+            if row_count > 0:
+                total_rows += row_count
+                tables_with_data += 1
+            if table.foreign_keys:
+                tables_with_fk += 1
+
         return {
             'total_tables': len(schema),
             'active_tables': len(active_tables),
             'inactive_tables': len(schema) - len(active_tables),
             'total_rows': total_rows,
-            'tables_with_data': len([t for t in schema.values() if t.row_count > 0]),
-            'tables_with_foreign_keys': len([t for t in schema.values() if t.foreign_keys]),
+            'tables_with_data': tables_with_data,
+            'tables_with_foreign_keys': tables_with_fk,
             'last_update': datetime.now().isoformat()
         }
 
+    @staticmethod
+    def _build_table_features(schema: Dict[str, TableInfo]) -> Dict[str, _TableFeatures]:
+        """Precalcular por tabla los datos de scoring que no dependen de la consulta."""
+        return {
+            table_name: _table_features(
+                table_name,
+                table_info.row_count,
+                len(table_info.foreign_keys),
+                [col['name'] for col in table_info.columns]
+            )
+            for table_name, table_info in schema.items()
+        }
+
+    def _refresh_table_features(self, table_names):
+        """Recalcular la importancia precalculada de tablas cuyos conteos cambiaron."""
+        full_schema = self.schema_cache.get('full_schema', {})
+        table_features = self.schema_cache.get('table_features')
+        if table_features is not None:
+            table_features.update(self._build_table_features(
+                {name: full_schema[name] for name in table_names if name in full_schema}
+            ))
+
     def _expand_query_with_synonyms(self, query: str) -> str:
         """
         Expandir query con sinónimos del dominio antes de generar embedding.
@@ -1906,6 +3360,8 @@ class SchemaManager:
             if not self.schema_cache:
                 logger.info("Esquema no cargado, cargando ahora...")
                 self.load_and_process_schema()
+            else:
+                self._maybe_refresh_async()
 
             # 🚀 EXPANSIÓN DE SINÓNIMOS: Mejorar precisión de RAG
             logger.info(f"🔍 Query original: '{query}'")
@@ -1915,8 +3371,12 @@ class SchemaManager:
             else:
                 logger.info(f"🔍 Sin sinónimos encontrados, usando query original")
 
-            # Generar embedding de la consulta EXPANDIDA
-            query_embedding = self.embedding_generator.generate_embedding(expanded_query)
+            # Generar embedding de la consulta EXPANDIDA (o reutilizar el de una consulta repetida)
+            query_embedding = self._query_embedding_cache.get(expanded_query)
+            if query_embedding is None:
+                query_embedding = self.embedding_generator.generate_embedding(expanded_query)
+                if query_embedding.any():  # No guardar el vector cero de un error de la API
+                    self._query_embedding_cache.set(expanded_query, query_embedding)
             
             # Buscar tablas similares
             similar_tables = self.vector_store.search_similar_tables(
@@ -1940,17 +3400,10 @@ class SchemaManager:
                         'similarity_score': table_result['similarity'],
                         'description': table_result['description'],
                         'row_count': table_info.row_count,
-                        'columns': [
-                            {
-                                'name': col['name'],
-                                'type': col['data_type'],
-                                'nullable': col['nullable']
-                            }
-                            for col in table_info.columns
-                        ],
+                        'columns': self._columns_view(table_name, table_info),
                         'primary_keys': table_info.primary_keys,
                         'foreign_keys': table_info.foreign_keys,
-                        'relationships': db.get_table_relationships(table_name),
+                        'relationships': {},  # Se completa al final para las tablas seleccionadas
                         'is_related': False  # Es una tabla principal, no relacionada
                     }
                     
@@ -1983,6 +3436,11 @@ class SchemaManager:
                     is_related = " [RELACIONADA]" if table.get('is_related', False) else " [PRINCIPAL]"
                     logger.info(f"  {i}. {table['name']}{is_related} (score: {table.get('similarity_score', 0):.4f})")
 
+            # Relaciones solo de las tablas finales, en una sola pasada por el esquema
+            relationships = db.get_table_relationships_bulk([table['name'] for table in relevant_tables])
+            for table in relevant_tables:
+                table['relationships'] = relationships.get(table['name'], {})
+
             return relevant_tables
             
         except Exception as e:
@@ -1993,89 +3451,99 @@ class SchemaManager:
         """Generar contexto textual de tablas para enviar a la IA."""
         if not table_names:
             return ""
-        
-        context_parts = ["Tablas relevantes para esta consulta:\n"]
-        
-        for table_name in table_names:
-            if table_name not in self.schema_cache.get('full_schema', {}):
-                continue
-            
-            table_info = self.schema_cache['full_schema'][table_name]
-            
-            # Información básica
+
+        # Evitar emitir solo el encabezado si ninguna tabla está en el esquema
+        full_schema = self.schema_cache.get('full_schema', {})
+        hits = [t for t in table_names if t in full_schema]
+        if not hits:
+            return ""
+
+        context_parts = [_TABLE_CONTEXT_HEADER]
+
+        for table_name in hits:
+            table_info = full_schema[table_name]
+
+            # Información básica (el conteo cambia con las estadísticas; el resto se cachea)
             context_parts.append(f"- {table_name} ({DataFormatter.format_number(table_info.row_count)} registros):")
-            
-            # Mostrar TODAS las columnas importantes (máximo 30 para RAG, todas para refinamiento)
-            max_cols = min(30, len(table_info.columns))
-            main_columns = table_info.columns[:max_cols]
-
-            # Agrupar columnas por línea para mejor legibilidad
-            col_names = [col['name'] for col in main_columns]
-            context_parts.append(f"  Columnas: {', '.join(col_names)}")
-
-            # Si hay más columnas, indicarlo
-            if len(table_info.columns) > max_cols:
-                remaining = len(table_info.columns) - max_cols
-                context_parts.append(f"  ... y {remaining} columnas más")
-
-            # Información adicional sobre claves e índices
-            if table_info.primary_keys:
-                context_parts.append(f"  Clave primaria: {', '.join(table_info.primary_keys)}")
-
-            if table_info.indexes:
-                indexed_cols = []
-                for idx in table_info.indexes[:5]:  # Primeros 5 índices
-                    if idx.get('columns'):
-                        for col in idx['columns']:
-                            if col['name'] not in indexed_cols:
-                                indexed_cols.append(col['name'])
-                if indexed_cols:
-                    context_parts.append(f"  Columnas indexadas: {', '.join(indexed_cols[:10])}")
-
-            if table_info.foreign_keys:
-                fk_info = []
-                for fk in table_info.foreign_keys[:3]:  # Primeras 3 FKs
-                    ref_table = fk.get('referenced_table', '')
-                    if ref_table:
-                        fk_info.append(f"{', '.join(fk.get('columns', []))} → {ref_table}")
-                if fk_info:
-                    context_parts.append(f"  Relaciones: {'; '.join(fk_info)}")
-
-            # Añadir semántica de columnas clave
-            semantic_cols = []
-            for col in main_columns:
-                col_name = col['name'].upper()
-                if col_name in COLUMN_SEMANTICS:
-                    semantic_cols.append(f"    {col_name}: {COLUMN_SEMANTICS[col_name]}")
-
-            if semantic_cols:
-                context_parts.append(f"  💡 Información clave de columnas:")
-                context_parts.extend(semantic_cols)
-
-            # Añadir notas especiales para tablas críticas
-            if 'DOCTOS_PV_DET' in table_name:
-                context_parts.append("  ⚠️ IMPORTANTE: Filtrar DESCRIPCION1 para excluir VENTA GLOBAL y artículos de sistema")
-            if 'ARTICULOS' in table_name:
-                context_parts.append("  ⚠️ IMPORTANTE: Excluir artículos con NOMBRE conteniendo GLOBAL, CORTE, SISTEMA")
-            if 'DOCTOS_PV' in table_name:
-                context_parts.append("  ⚠️ IMPORTANTE: NO tiene columna SERIE (solo TIPO_DOCTO + FOLIO)")
-            if 'DOCTOS_VE' in table_name:
-                context_parts.append("  ⚠️ IMPORTANTE: NO tiene columna SERIE (solo TIPO_DOCTO + FOLIO)")
-            
-            # Claves primarias
-            if table_info.primary_keys:
-                context_parts.append(f"  Clave primaria: {', '.join(table_info.primary_keys)}")
-            
-            # Relaciones
-            relationships = db.get_table_relationships(table_name)
-            if relationships['references']:
-                referenced_tables = [ref['table'] for ref in relationships['references']]
-                context_parts.append(f"  Referencia a: {', '.join(referenced_tables)}")
 
-            context_parts.append("")  # Línea vacía
-        
+            cached = self._context_fragments.get(table_name)
+            if cached is None or cached[0] is not table_info:
+                cached = (table_info, self._build_table_context_fragment(table_name, table_info))
+                self._context_fragments[table_name] = cached
+            context_parts.append(cached[1])
+
         return "\n".join(context_parts)
     
+    def _build_table_context_fragment(self, table_name: str, table_info: TableInfo) -> str:
+        """
+        Bloque de contexto de una tabla (sin la línea de encabezado) para get_table_context.
+
+        Se cachea por objeto TableInfo: una recarga del esquema crea objetos nuevos.
+        """
+        lines = []
+
+        # Mostrar TODAS las columnas importantes (máximo 30 para RAG, todas para refinamiento)
+        max_cols = min(30, len(table_info.columns))
+        main_columns = table_info.columns[:max_cols]
+
+        # Agrupar columnas por línea para mejor legibilidad
+        col_names = [col['name'] for col in main_columns]
+        lines.append(f"  Columnas: {', '.join(col_names)}")
+
+        # Si hay más columnas, indicarlo
+        if len(table_info.columns) > max_cols:
+            remaining = len(table_info.columns) - max_cols
+            lines.append(f"  ... y {remaining} columnas más")
+
+        # Información adicional sobre claves e índices
+        if table_info.primary_keys:
+            lines.append(f"  Clave primaria: {', '.join(table_info.primary_keys)}")
+
+        if table_info.indexes:
+            # Hasta 10 columnas distintas de los primeros 5 índices, en orden de aparición
+            indexed_cols = {}
+            for idx in table_info.indexes[:5]:
+                for col in idx.get('columns') or ():
+                    indexed_cols.setdefault(col['name'])
+                    if len(indexed_cols) >= 10:
+                        break
+                if len(indexed_cols) >= 10:
+                    break
+            if indexed_cols:
+                lines.append(f"  Columnas indexadas: {', '.join(indexed_cols)}")
+
+        if table_info.foreign_keys:
+            fk_info = []
+            for fk in table_info.foreign_keys[:3]:  # Primeras 3 FKs
+                ref_table = fk.get('referenced_table', '')
+                if ref_table:
+                    fk_info.append(f"{', '.join(fk.get('columns', []))} → {ref_table}")
+            if fk_info:
+                lines.append(f"  Relaciones: {'; '.join(fk_info)}")
+
+        # Añadir semántica de columnas clave
+        semantic_cols = []
+        for col in main_columns:
+            col_name = col['name'].upper()
+            semantics = COLUMN_SEMANTICS.get(col_name)
+            if semantics:
+                semantic_cols.append(f"    {col_name}: {semantics}")
+
+        if semantic_cols:
+            lines.append(f"  💡 Información clave de columnas:")
+            lines.extend(semantic_cols)
+
+        # Añadir notas especiales para tablas críticas
+        lines.extend(f"  {note}" for pattern, note in _CRITICAL_TABLE_NOTES.items() if pattern in table_name)
+
+        # Relaciones (las FK salientes de la tabla; lo mismo que db.get_table_relationships()['references'])
+        if table_info.foreign_keys:
+            referenced_tables = [fk['referenced_table'] for fk in table_info.foreign_keys]
+            lines.append(f"  Referencia a: {', '.join(referenced_tables)}")
+
+        lines.append("")  # Línea vacía
+        return "\n".join(lines)
+
     def get_schema_summary(self) -> Dict[str, Any]:
         """Obtener resumen del esquema procesado."""
         if not self.schema_cache:
@@ -2094,52 +3562,72 @@ class SchemaManager:
         }
     
     def start_auto_update_thread(self):
-        """Iniciar thread para actualización automática cada 12 horas."""
-        if self._auto_update_thread and self._auto_update_thread.is_alive():
-            logger.warning("Thread de auto-actualización ya está corriendo")
-            return
-        
-        self._stop_auto_update.clear()
-        self._auto_update_thread = threading.Thread(
-            target=self._auto_update_worker,
-            daemon=True,
-            name="SchemaAutoUpdate"
-        )
-        self._auto_update_thread.start()
+        """Programar actualización automática cada 12 horas."""
+        with self._auto_update_lock:
+            if self._auto_update_timer is not None:
+                logger.warning("Auto-actualización ya está programada")
+                return
+
+            self._schedule_auto_update()
         logger.info(f"Thread de auto-actualización iniciado (intervalo: {self.auto_update_interval/3600:.1f} horas)")
+
+    def _schedule_auto_update(self):
+        """Programar la siguiente ejecución (llamar con _auto_update_lock tomado)."""
+        timer = threading.Timer(self.auto_update_interval, self._run_auto_update)
+        timer.daemon = True
+        timer.name = "SchemaAutoUpdate"
+        self._auto_update_timer = timer
+        timer.start()
     
-    def _auto_update_worker(self):
-        """Worker thread para actualización automática de estadísticas."""
-        while not self._stop_auto_update.is_set():
-            try:
-                # Esperar el intervalo de actualización
-                if self._stop_auto_update.wait(self.auto_update_interval):
-                    break  # Se solicitó detener
-                
-                logger.info("🔄 Iniciando actualización automática de estadísticas...")
-                
-                # Actualizar solo estadísticas (conteos), no todo el esquema
-                stats = db.update_table_stats(force=True)
+    def _run_auto_update(self):
+        """Actualización automática de estadísticas; al terminar se reprograma a sí misma."""
+        try:
+            logger.info("🔄 Iniciando actualización automática de estadísticas...")
+            
+            # Actualizar solo estadísticas (conteos), no todo el esquema
+            stats = db.update_table_stats(force=True)
+            
+            if stats:
+                logger.info(f"✅ Actualización automática completada: {len(stats)} tablas actualizadas")
+                # Actualizar timestamp
+                self._mark_schema_updated()
+                self._refresh_table_features(stats)
+            else:
+                logger.warning("⚠️ Actualización automática no retornó resultados")
                 
-                if stats:
-                    logger.info(f"✅ Actualización automática completada: {len(stats)} tablas actualizadas")
-                    # Actualizar timestamp
-                    self.last_schema_update = datetime.now()
-                else:
-                    logger.warning("⚠️ Actualización automática no retornó resultados")
-                    
-            except Exception as e:
-                logger.error(f"Error en actualización automática: {e}")
-                # Continuar a pesar del error
+        except Exception as e:
+            logger.error(f"Error en actualización automática: {e}")
+            # Continuar a pesar del error
+        finally:
+            # Un stop() + start() durante la ejecución ya programó otro timer: no duplicar la cadena
+            with self._auto_update_lock:
+                if self._auto_update_timer is threading.current_thread():
+                    self._schedule_auto_update()
     
     def stop_auto_update_thread(self):
-        """Detener thread de auto-actualización."""
-        if self._auto_update_thread and self._auto_update_thread.is_alive():
+        """Detener auto-actualización (cancela el timer pendiente)."""
+        with self._auto_update_lock:
+            timer = self._auto_update_timer
+            self._auto_update_timer = None
+
+        if timer is not None:
             logger.info("Deteniendo thread de auto-actualización...")
-            self._stop_auto_update.set()
-            self._auto_update_thread.join(timeout=5)
+            timer.cancel()
             logger.info("Thread de auto-actualización detenido")
     
+    def close(self):
+        """
+        Detener la auto-actualización y no iniciar más recargas en segundo plano.
+
+        Se llama al salir (atexit), cuando los handlers de logging pueden estar cerrados: no registra nada.
+        """
+        self._closed = True
+        with self._auto_update_lock:
+            timer = self._auto_update_timer
+            self._auto_update_timer = None
+        if timer is not None:
+            timer.cancel()
+
     def update_statistics_only(self, table_names: List[str] = None) -> Dict[str, int]:
         """
         Actualizar solo las estadísticas de tablas sin recargar el esquema completo.
@@ -2153,7 +3641,8 @@ class SchemaManager:
         stats = db.update_table_stats(table_names=table_names, force=True)
         
         if stats:
-            self.last_schema_update = datetime.now()
+            self._mark_schema_updated()
+            self._refresh_table_features(stats)
             logger.info(f"Estadísticas actualizadas manualmente: {len(stats)} tablas")
         
         return stats
@@ -0,0 +1,300 @@
+"""
+Pruebas del RAG que no requieren base de datos ni API de OpenAI.
+
+Cubren la selección top-k estable, el almacén de embeddings, las cachés de
+embeddings, la huella de descripciones y que las descripciones sean idénticas
+entre ejecuciones (PYTHONHASHSEED distinto).
+
+Ejecutar: python test_rag_offline.py  (o con pytest)
+"""
+
+import atexit
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Agregar el directorio raíz al path para importar módulos
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from config import config
+
+# Cachés y almacén vectorial en un directorio temporal (no tocar ./data)
+_TEMP_DIR = tempfile.mkdtemp(prefix="rag_offline_")
+atexit.register(shutil.rmtree, _TEMP_DIR, True)
+config.rag.vector_db_path = _TEMP_DIR
+
+from database import TableInfo
+from schema_manager import (
+    SchemaManager, TableDescriptor, TableEmbeddingStore, EmbeddingCache, QueryEmbeddingCache,
+    _stable_top_k, _table_stem, _description_fingerprint, EMBEDDING_DIMENSIONS
+)
+
+
+def _sample_table(with_name_lower: bool = True) -> TableInfo:
+    """Tabla de ejemplo con columnas, PK, FK e índices (sin BD)."""
+    columns = [
+        {'name': 'ARTICULO_ID', 'data_type': 'INTEGER', 'nullable': False, 'length': 4, 'scale': 0},
+        {'name': 'NOMBRE', 'data_type': 'VARCHAR', 'nullable': False, 'length': 100, 'scale': 0},
+        {'name': 'PRECIO_VENTA', 'data_type': 'NUMERIC', 'nullable': True, 'length': 8, 'scale': 2},
+        {'name': 'FECHA_ALTA', 'data_type': 'DATE', 'nullable': True, 'length': 4, 'scale': 0},
+        {'name': 'LINEA_ARTICULO_ID', 'data_type': 'INTEGER', 'nullable': True, 'length': 4, 'scale': 0},
+    ]
+    if with_name_lower:
+        for col in columns:
+            col['name_lower'] = col['name'].lower()
+    return TableInfo(
+        name='ARTICULOS', owner='SYSDBA', type='TABLE', row_count=1500,
+        columns=columns,
+        primary_keys=['ARTICULO_ID'],
+        foreign_keys=[{'constraint_name': 'FK_ART_LINEA', 'columns': ['LINEA_ARTICULO_ID'],
+                       'referenced_table': 'LINEAS_ARTICULOS', 'referenced_columns': ['LINEA_ARTICULO_ID']}],
+        indexes=[{'name': 'IX_ART_NOMBRE', 'unique': False, 'columns': [{'name': 'NOMBRE', 'position': 0}]}],
+    )
+
+
+def test_stable_top_k():
+    """_stable_top_k equivale a argsort estable truncado (empates en orden original)."""
+    print("🔍 TEST: _stable_top_k")
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, size=200).astype(np.float64)  # Muchos empates
+    expected = np.argsort(-scores, kind='stable')
+    for k in (None, 0, 1, 7, 50, 199, 200, 500):
+        result = _stable_top_k(scores, k)
+        reference = expected if k is None else expected[:max(k, 0)]
+        assert np.array_equal(result, reference), f"k={k}: orden distinto al argsort estable"
+    assert len(_stable_top_k(np.array([]), 3)) == 0, "Scores vacíos deben dar selección vacía"
+    print("✅ _stable_top_k correcto")
+
+
+def test_table_stem():
+    """_table_stem quita un solo plural en español."""
+    print("🔍 TEST: _table_stem")
+    cases = {
+        'articulos': 'articulo',
+        'proveedores': 'proveedor',
+        'almacenes': 'almacen',
+        'clientes': 'cliente',
+        'doctos_pv': 'doctos_pv',
+        'clases': 'clase',
+        'ss': 'ss',
+        'precios': 'precio',
+    }
+    for name, stem in cases.items():
+        assert _table_stem(name) == stem, f"{name}: esperado {stem}, obtenido {_table_stem(name)}"
+    print("✅ _table_stem correcto")
+
+
+def test_table_embedding_store():
+    """TableEmbeddingStore normaliza, reemplaza, crece y compacta filas."""
+    print("🔍 TEST: TableEmbeddingStore")
+    dim = 8
+    rng = np.random.default_rng(1)
+    store = TableEmbeddingStore(dim=dim)
+    names = [f"T{i}" for i in range(40)]  # Fuerza varios crecimientos de capacidad
+    vectors = rng.normal(size=(40, dim)).astype(np.float32)
+    store.upsert_many(names, vectors, [i % 2 == 0 for i in range(40)], [f"m{i}" for i in range(40)])
+
+    assert len(store) == 40 and store.names == names
+    assert np.allclose(np.linalg.norm(store.vectors, axis=1), 1.0, atol=1e-5), "Filas sin normalizar"
+    assert store.active_mask.tolist() == [i % 2 == 0 for i in range(40)]
+
+    # Reemplazar una fila existente conserva su posición
+    new_vector = np.ones((1, dim), dtype=np.float32)
+    store.upsert_many(['T3'], new_vector, [True], ['nuevo'])
+    assert len(store) == 40 and store.index['T3'] == 3
+    assert np.allclose(store.vectors[3], new_vector[0] / np.linalg.norm(new_vector[0]), atol=1e-6)
+    assert store.meta[3] == 'nuevo' and store.active_mask[3]
+
+    # Quitar filas compacta la matriz y conserva el orden del resto
+    expected_t10 = store.vectors[10].copy()
+    store.remove_many(['T0', 'T5', 'NO_EXISTE'])
+    assert len(store) == 38 and 'T0' not in store.index and 'T5' not in store.index
+    assert store.names == [name for name in names if name not in ('T0', 'T5')]
+    assert all(store.index[name] == row for row, name in enumerate(store.names))
+    assert np.allclose(store.vectors[store.index['T10']], expected_t10)
+
+    # Adoptar una matriz de solo lectura y escribir sobre ella (se copia al primer cambio)
+    readonly = store.vectors.copy()
+    readonly.flags.writeable = False
+    other = TableEmbeddingStore(dim=dim)
+    other.load(store.names, readonly, store.active_mask.copy(), list(store.meta))
+    other.upsert_many(['NUEVA'], np.ones((1, dim), dtype=np.float32), [True])
+    assert len(other) == 39 and np.array_equal(other.vectors[:38], readonly)
+    print("✅ TableEmbeddingStore correcto")
+
+
+def test_query_embedding_cache():
+    """QueryEmbeddingCache: clave normalizada, desalojo LRU y expiración por TTL."""
+    print("🔍 TEST: QueryEmbeddingCache (LRU + TTL)")
+    cache = QueryEmbeddingCache(maxsize=2, ttl_seconds=60)
+    a, b, c = (np.full(3, value, dtype=np.float32) for value in (1, 2, 3))
+
+    cache.set("Ventas  del MES", a)
+    assert cache.get("ventas del mes") is a, "La clave debe normalizar mayúsculas y espacios"
+
+    cache.set("b", b)
+    cache.get("ventas del mes")  # "b" queda como la menos reciente
+    cache.set("c", c)
+    assert cache.get("b") is None, "Debe desalojar la entrada menos reciente"
+    assert cache.get("ventas del mes") is a and cache.get("c") is c
+
+    expiring = QueryEmbeddingCache(maxsize=10, ttl_seconds=0.05)
+    expiring.set("x", a)
+    time.sleep(0.1)
+    assert expiring.get("x") is None, "La entrada debe expirar tras el TTL"
+
+    cache.clear()
+    assert cache.get("c") is None
+    print("✅ QueryEmbeddingCache correcto")
+
+
+def test_embedding_cache_codecs():
+    """EmbeddingCache guarda en fp16 (zstd si existe) o fp32 y lee filas de ambos formatos."""
+    print("🔍 TEST: EmbeddingCache (codecs)")
+    original_fp16 = config.rag.embedding_cache_fp16
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(3, EMBEDDING_DIMENSIONS)).astype(np.float32)
+    cache = EmbeddingCache(db_path=os.path.join(_TEMP_DIR, "codec_cache.sqlite3"))
+    try:
+        config.rag.embedding_cache_fp16 = False
+        cache.set_many(['f32'], vectors[:1])
+        config.rag.embedding_cache_fp16 = True
+        cache.set_many(['f16_a', 'f16_b'], vectors[1:])
+
+        codecs = dict(cache._get_conn().execute("SELECT codec, COUNT(*) FROM embeddings GROUP BY codec"))
+        assert codecs.get('f32') == 1, f"Codecs guardados: {codecs}"
+        assert codecs.get('f16', 0) + codecs.get('f16zst', 0) == 2, f"Codecs guardados: {codecs}"
+
+        found = cache.get_many(['f32', 'no_existe', 'f16_a', 'f16_b'])
+        assert sorted(found) == [0, 2, 3], "Solo deben devolverse los aciertos"
+        assert all(found[i].dtype == np.float32 for i in found)
+        assert np.array_equal(found[0], vectors[0]), "fp32 debe ser exacto"
+        assert np.allclose(found[2], vectors[1], atol=1e-2) and np.allclose(found[3], vectors[2], atol=1e-2)
+        assert cache.get('no_existe') is None
+    finally:
+        config.rag.embedding_cache_fp16 = original_fp16
+    print("✅ EmbeddingCache correcto")
+
+
+def test_description_fingerprint():
+    """La huella ignora claves derivadas y el número exacto de registros, no la estructura."""
+    print("🔍 TEST: _description_fingerprint")
+    base = _description_fingerprint(_sample_table())
+    assert base == _description_fingerprint(_sample_table(with_name_lower=False)), \
+        "name_lower es derivado y no debe cambiar la huella"
+
+    table = _sample_table()
+    table.row_count = 987654
+    assert _description_fingerprint(table) == base, "Solo cambió el volumen: la huella se conserva"
+
+    table = _sample_table()
+    table.row_count = 0
+    assert _description_fingerprint(table) != base, "Pasar a tabla vacía cambia la descripción"
+
+    table = _sample_table()
+    table.columns.append({'name': 'EXTRA', 'data_type': 'VARCHAR', 'nullable': True, 'length': 10, 'scale': 0})
+    assert _description_fingerprint(table) != base, "Una columna nueva debe cambiar la huella"
+
+    table = _sample_table()
+    table.indexes[0]['unique'] = True
+    assert _description_fingerprint(table) != base, "Un índice distinto debe cambiar la huella"
+    print("✅ _description_fingerprint correcto")
+
+
+def test_rank_graph_related():
+    """_rank_graph_related ordena por score (empates en orden del grafo) y omite las agregadas."""
+    print("🔍 TEST: _rank_graph_related")
+    manager = SchemaManager()
+    try:
+        manager.schema_cache = {}
+        manager.relationships_graph = {
+            'ARTICULOS': ['ALMACENES', 'CLAVES_ARTICULOS', 'PRECIOS_ARTICULOS',
+                          'GRUPOS_LINEAS', 'ARTICULOS_DET', 'MONEDAS', 'IMPUESTOS'],
+        }
+        manager._graph_related_scores = {}
+
+        ranked = manager._rank_graph_related('ARTICULOS', set(), 10)
+        # claves + articulo = 18, precios + articulo = 17, det + articulo = 18, grupos = 7
+        assert ranked == ['CLAVES_ARTICULOS', 'ARTICULOS_DET', 'PRECIOS_ARTICULOS',
+                          'GRUPOS_LINEAS', 'ALMACENES', 'MONEDAS', 'IMPUESTOS'], ranked
+
+        assert manager._rank_graph_related('ARTICULOS', {'CLAVES_ARTICULOS'}, 2) == \
+            ['ARTICULOS_DET', 'PRECIOS_ARTICULOS']
+        assert manager._rank_graph_related('SIN_RELACIONES', set(), 5) == []
+    finally:
+        manager.close()
+    print("✅ _rank_graph_related correcto")
+
+
+# Script que imprime el hash de las descripciones de tablas de ejemplo
+_DESCRIPTION_HASH_SCRIPT = """
+import hashlib, sys
+sys.path.insert(0, {root!r})
+from config import config
+config.rag.vector_db_path = {temp_dir!r}
+import test_rag_offline as t
+from schema_manager import TableDescriptor
+tables = [t._sample_table(), t._sample_table(with_name_lower=False)]
+tables[1].name = tables[1].name_lower = 'DOCTOS_VE_DET'
+text = '\\n'.join(TableDescriptor.describe_table(table) for table in tables)
+print(hashlib.sha256(text.encode('utf-8')).hexdigest())
+"""
+
+
+def test_descriptions_deterministic_across_hash_seeds():
+    """describe_table produce el mismo texto con cualquier PYTHONHASHSEED (embeddings en caché)."""
+    print("🔍 TEST: descripciones deterministas entre procesos")
+    root = os.path.dirname(os.path.abspath(__file__))
+    script = _DESCRIPTION_HASH_SCRIPT.format(root=root, temp_dir=_TEMP_DIR)
+    hashes = set()
+    for seed in ('0', '1', '12345'):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, env=env,
+                                capture_output=True, text=True, timeout=120)
+        assert output.returncode == 0, output.stderr[-2000:]
+        hashes.add(output.stdout.strip().splitlines()[-1])
+    assert len(hashes) == 1, f"Descripciones distintas según PYTHONHASHSEED: {hashes}"
+
+    description = TableDescriptor.describe_table(_sample_table())
+    assert description == TableDescriptor.describe_table(_sample_table(with_name_lower=False))
+    print("✅ Descripciones deterministas")
+
+
+def main():
+    """Ejecutar todos los tests."""
+    print("\n" + "=" * 80)
+    print("🚀 PRUEBAS OFFLINE DEL RAG")
+    print("=" * 80)
+
+    try:
+        test_stable_top_k()
+        test_table_stem()
+        test_table_embedding_store()
+        test_query_embedding_cache()
+        test_embedding_cache_codecs()
+        test_description_fingerprint()
+        test_rank_graph_related()
+        test_descriptions_deterministic_across_hash_seeds()
+
+        print("\n" + "=" * 80)
+        print("✅ ¡TODOS LOS TESTS PASARON EXITOSAMENTE!")
+        print("=" * 80)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n❌ ERROR EN TEST: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ ERROR INESPERADO: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -188,6 +188,10 @@ class Logger:
     def debug(self, message: str, **kwargs):
         """Log mensaje de debug."""
         self._logger.debug(message, extra=kwargs)
+
+    def is_debug_enabled(self) -> bool:
+        """Indica si se emiten mensajes de debug (evita formatear logs por elemento en bucles)."""
+        return self._logger.isEnabledFor(logging.DEBUG)
     
     def sql_query(self, sql: str, params: dict = None, execution_time: float = None):
         """Log específico para queries SQL."""